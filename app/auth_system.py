@@ -5,21 +5,118 @@ Complete user management with roles, permissions, and session handling
 
 import bcrypt
 from jose import jwt
+import asyncio
+import atexit
+import hashlib
 import json
+import os
+import queue
+import threading
+import time
+from array import array
+from bisect import bisect_left, bisect_right
+from collections import Counter, OrderedDict, defaultdict
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timedelta
 from pathlib import Path
 from typing import Dict, Optional, List, Any
 from fastapi import HTTPException, Request, Depends
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
+from app.paging import decode_cursor, encode_cursor
 
 # Configuration
 SECRET_KEY = "your-secret-key-change-this-in-production"  # TODO: Use environment variable
 ALGORITHM = "HS256"
 ACCESS_TOKEN_EXPIRE_MINUTES = 1440  # 24 hours
+TOKEN_CACHE_TTL_SECONDS = 60  # How long a verified token is trusted without re-decoding
+TOKEN_CACHE_SIZE = 1024  # Verified tokens kept, least recently used evicted first
+
+# Password hashing runs on a bounded worker pool, off the event loop
+PASSWORD_HASH_WORKERS = min(4, os.cpu_count() or 1)
+
+# Login rate limiting (token bucket per IP and per username)
+LOGIN_BUCKET_CAPACITY = 5  # Attempts allowed in a burst
+LOGIN_BUCKET_REFILL_PER_SECOND = 5 / 60  # Sustained rate: 5 attempts per minute
+
+# Audit log storage
+AUDIT_SEGMENT_SIZE = 1000  # Entries per JSONL segment file
+AUDIT_MAX_SEGMENTS = 2000  # Oldest segment is dropped beyond this (2M entries; only offsets stay in memory)
+AUDIT_FLUSH_BATCH_SIZE = 100  # Flush once this many entries are queued...
+AUDIT_FLUSH_INTERVAL = 1.0  # ...or after this many seconds
 
 # Security scheme for FastAPI
 security = HTTPBearer()
 
+# bcrypt releases the GIL, so a thread pool spreads hashes across cores
+password_executor = ThreadPoolExecutor(
+    max_workers=PASSWORD_HASH_WORKERS, thread_name_prefix="password-hash"
+)
+password_semaphore = asyncio.Semaphore(PASSWORD_HASH_WORKERS)
+
+
+async def run_password_work(func, *args):
+    """Run a bcrypt call on the worker pool, capping concurrent hashes"""
+    async with password_semaphore:
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(password_executor, func, *args)
+
+
+class TokenBucketLimiter:
+    """Per-key token bucket rate limiter"""
+
+    def __init__(self, capacity: float, refill_per_second: float, max_keys: int = 10000):
+        self.capacity = capacity
+        self.refill_per_second = refill_per_second
+        self.max_keys = max_keys
+        self.buckets: Dict[str, List[float]] = {}  # key -> [tokens, last_refill]
+        self.lock = threading.Lock()
+
+    def allow(self, *keys: str) -> bool:
+        """Take one token from every key's bucket, or none if any is empty"""
+        now = time.monotonic()
+        with self.lock:
+            buckets = []
+            for key in keys:
+                bucket = self.buckets.get(key)
+                if bucket is None:
+                    bucket = [self.capacity, now]
+                else:
+                    elapsed = now - bucket[1]
+                    bucket = [min(self.capacity, bucket[0] + elapsed * self.refill_per_second), now]
+                buckets.append((key, bucket))
+
+            allowed = all(bucket[0] >= 1 for _, bucket in buckets)
+            for key, bucket in buckets:
+                if allowed:
+                    bucket[0] -= 1
+                self.buckets[key] = bucket
+
+            if len(self.buckets) > self.max_keys:
+                self._prune(now)
+
+            return allowed
+
+    def retry_after(self, *keys: str) -> int:
+        """Seconds until every key's bucket has a token again"""
+        now = time.monotonic()
+        wait = 0.0
+        with self.lock:
+            for key in keys:
+                bucket = self.buckets.get(key)
+                if bucket:
+                    tokens = bucket[0] + (now - bucket[1]) * self.refill_per_second
+                    wait = max(wait, (1 - tokens) / self.refill_per_second)
+        return max(1, int(wait + 0.999))
+
+    def _prune(self, now: float):
+        """Forget buckets that have refilled completely"""
+        full_after = self.capacity / self.refill_per_second
+        self.buckets = {
+            key: bucket for key, bucket in self.buckets.items()
+            if now - bucket[1] < full_after
+        }
+
+
 class UserManager:
     """Manages user accounts, authentication, and permissions"""
 
@@ -29,6 +126,10 @@ class UserManager:
         self.users = self._load_users()
         self._initialize_default_users()
 
+        # Verified tokens: sha256(token) -> (expires_at, principal)
+        self.token_cache: "OrderedDict[str, tuple]" = OrderedDict()
+        self.token_cache_lock = threading.Lock()
+
     def _load_users(self) -> Dict:
         """Load users from storage"""
         if self.storage_path.exists():
@@ -96,22 +197,37 @@ class UserManager:
             hashed_password.encode('utf-8')
         )
 
+    def _login_candidate(self, username: str) -> Optional[Dict]:
+        """Stored record of a user allowed to log in, or None"""
+        user = self.users.get(username)
+        if not user or not user.get("active", True):
+            return None
+        return user
+
+    @staticmethod
+    def _public_user(username: str, user: Dict) -> Dict:
+        """User data without the password hash"""
+        user_data = {k: v for k, v in user.items() if k != "password"}
+        user_data["username"] = username
+        return user_data
+
     def authenticate_user(self, username: str, password: str) -> Optional[Dict]:
         """Authenticate a user and return user data if valid"""
-        if username not in self.users:
+        user = self._login_candidate(username)
+        if user is None or not self.verify_password(password, user["password"]):
             return None
+        return self._public_user(username, user)
 
-        user = self.users[username]
-        if not user.get("active", True):
-            return None
+    async def hash_password_async(self, password: str) -> str:
+        """Hash a password on the worker pool"""
+        return await run_password_work(self._hash_password, password)
 
-        if not self.verify_password(password, user["password"]):
+    async def authenticate_user_async(self, username: str, password: str) -> Optional[Dict]:
+        """Authenticate a user without blocking the event loop"""
+        user = self._login_candidate(username)
+        if user is None or not await run_password_work(self.verify_password, password, user["password"]):
             return None
-
-        # Return user data without password
-        user_data = {k: v for k, v in user.items() if k != "password"}
-        user_data["username"] = username
-        return user_data
+        return self._public_user(username, user)
 
     def create_access_token(self, username: str) -> str:
         """Create a JWT access token"""
@@ -142,6 +258,57 @@ class UserManager:
         except jwt.JWTError:
             return None
 
+    def resolve_token(self, token: str) -> Optional[Dict]:
+        """
+        Verify a token and return the user it belongs to, with caching.
+
+        Verified tokens are cached by hash for TOKEN_CACHE_TTL_SECONDS (never
+        past the token's own expiry) so repeat requests skip the JWT decode.
+
+        Returns:
+            User data without password plus "username", or None if invalid
+        """
+        key = hashlib.sha256(token.encode('utf-8')).hexdigest()
+        now = time.time()
+
+        with self.token_cache_lock:
+            cached = self.token_cache.get(key)
+            if cached and cached[0] > now:
+                self.token_cache.move_to_end(key)
+                return cached[1]
+
+        payload = self.verify_token(token)
+        if not payload:
+            return None
+
+        username = payload.get("sub")
+        user = self.get_user(username)
+        if not user:
+            return None
+        principal = {**user, "username": username}
+
+        expires_at = now + TOKEN_CACHE_TTL_SECONDS
+        if isinstance(payload.get("exp"), (int, float)):
+            expires_at = min(expires_at, payload["exp"])
+
+        with self.token_cache_lock:
+            self.token_cache[key] = (expires_at, principal)
+            self.token_cache.move_to_end(key)
+            while len(self.token_cache) > TOKEN_CACHE_SIZE:
+                self.token_cache.popitem(last=False)
+
+        return principal
+
+    def invalidate_tokens(self, username: str):
+        """Drop cached tokens for a user after their account changes"""
+        with self.token_cache_lock:
+            stale = [
+                key for key, (_, principal) in self.token_cache.items()
+                if principal["username"] == username
+            ]
+            for key in stale:
+                del self.token_cache[key]
+
     def check_permission(self, username: str, permission: str) -> bool:
         """Check if a user has a specific permission"""
         user = self.users.get(username)
@@ -171,21 +338,47 @@ class UserManager:
         self.users[username].update(updates)
         self.users[username]["updated_at"] = datetime.now().isoformat()
         self._save_users()
+        self.invalidate_tokens(username)
         return True
 
-    def change_password(self, username: str, old_password: str, new_password: str) -> bool:
-        """Change a user's password"""
+    def delete_user(self, username: str) -> bool:
+        """Delete a user account"""
         if username not in self.users:
             return False
 
-        if not self.verify_password(old_password, self.users[username]["password"]):
-            return False
+        del self.users[username]
+        self._save_users()
+        self.invalidate_tokens(username)
+        return True
+
+    def _store_password(self, username: str, new_hash: str) -> bool:
+        """Save a new password hash and revoke the user's tokens"""
+        if username not in self.users:
+            return False  # Deleted while hashing
 
-        self.users[username]["password"] = self._hash_password(new_password)
+        self.users[username]["password"] = new_hash
         self.users[username]["password_changed_at"] = datetime.now().isoformat()
         self._save_users()
+        self.invalidate_tokens(username)
         return True
 
+    def change_password(self, username: str, old_password: str, new_password: str) -> bool:
+        """Change a user's password"""
+        user = self.users.get(username)
+        if user is None or not self.verify_password(old_password, user["password"]):
+            return False
+        return self._store_password(username, self._hash_password(new_password))
+
+    async def change_password_async(self, username: str, old_password: str,
+                                    new_password: str) -> bool:
+        """Change a user's password without blocking the event loop"""
+        user = self.users.get(username)
+        if user is None or not await run_password_work(
+            self.verify_password, old_password, user["password"]
+        ):
+            return False
+        return self._store_password(username, await self.hash_password_async(new_password))
+
     def list_users(self) -> List[Dict]:
         """List all users without passwords"""
         return [
@@ -195,31 +388,240 @@ class UserManager:
 
 
 class AuditLogger:
-    """Tracks all user actions for security and compliance"""
+    """Tracks all user actions for security and compliance
+
+    Entries are appended to JSONL segment files by a background writer
+    thread, so logging an action never touches the disk on the request path.
+    Only entries still waiting for the writer are held in memory; older ones
+    are read back from their segment by byte offset when a query needs them.
+    Old entries are trimmed by dropping whole segments.
+
+    Every entry has a sequence number (its position since the log was
+    loaded). Per-username and per-action indexes hold sorted sequence
+    numbers, and entries are appended in timestamp order, so filters and
+    time ranges resolve with binary search instead of full scans.
+    """
 
     def __init__(self, log_path: str = "data/audit_logs.json"):
         self.log_path = Path(log_path)
         self.log_path.parent.mkdir(exist_ok=True)
-        self.logs = self._load_logs()
+        # Segments live next to the legacy file: data/audit_logs/segment_*.jsonl
+        self.segment_dir = self.log_path.with_suffix("")
+        self.segment_dir.mkdir(exist_ok=True)
+
+        self.lock = threading.Lock()
+        self.segment_lock = threading.Lock()
+        # Oldest first; each holds its entries' byte offsets, not the entries
+        self.segments: List[Dict] = []
+        self.base_seq = 0  # Sequence number of the oldest retained entry
+        self.flushed_seq = 0  # Entries before this are on disk
+        self.pending: List[Dict] = []  # Not yet written; pending[i] has seq flushed_seq + i
+
+        # Secondary indexes: sequence numbers of matching entries, oldest first
+        self.user_index: Dict[str, array] = defaultdict(lambda: array("q"))
+        self.action_index: Dict[str, array] = defaultdict(lambda: array("q"))
+        self._load_logs()
+
+        # Background writer
+        self.queue: "queue.Queue[Optional[Dict]]" = queue.Queue()
+        self.writer = threading.Thread(
+            target=self._writer_loop, name="audit-log-writer", daemon=True
+        )
+        self.writer.start()
+        atexit.register(self.flush)
+
+    def _load_logs(self):
+        """Index existing segment files, keeping only offsets in memory"""
+        self._migrate_legacy_log()
 
-    def _load_logs(self) -> List[Dict]:
-        """Load existing audit logs"""
-        if self.log_path.exists():
+        for path in sorted(self.segment_dir.glob("segment_*.jsonl")):
+            segment = self._new_segment(path)
             try:
-                with open(self.log_path, 'r') as f:
-                    return json.load(f)
-            except:
-                return []
-        return []
+                with open(path, 'rb') as f:
+                    for line in f:
+                        # Skip torn or corrupt lines
+                        try:
+                            entry = json.loads(line)
+                        except ValueError:
+                            entry = None
+                        if isinstance(entry, dict):
+                            self._index_entry(segment["first_seq"] + len(segment["offsets"]), entry)
+                            self._add_to_segment(segment, segment["size"], entry)
+                        segment["size"] += len(line)
+            except OSError:
+                pass
+            if not segment["offsets"]:
+                path.unlink(missing_ok=True)
+                continue
+            self.segments.append(segment)
+            self.flushed_seq += len(segment["offsets"])
+
+        # Enforce the retention limit in case it was lowered
+        while len(self.segments) > AUDIT_MAX_SEGMENTS:
+            self._drop_oldest_segment()
+
+    def _new_segment(self, path: Path) -> Dict:
+        """Empty segment metadata starting at the next unwritten sequence number"""
+        return {
+            "path": path,
+            "first_seq": self.flushed_seq,
+            "offsets": array("q"),  # Byte offset of each entry's line
+            "size": 0,
+            "last_timestamp": "",
+            # Per-key entry counts, to trim the indexes when the segment is dropped
+            "users": Counter(),
+            "actions": Counter()
+        }
+
+    @staticmethod
+    def _add_to_segment(segment: Dict, offset: int, entry: Dict):
+        """Record an entry written to a segment at a byte offset"""
+        segment["offsets"].append(offset)
+        segment["last_timestamp"] = entry.get("timestamp", "")
+        segment["users"][entry.get("username")] += 1
+        segment["actions"][entry.get("action")] += 1
 
-    def _save_logs(self):
-        """Save audit logs to file"""
-        # Keep only last 10000 entries to prevent file from growing too large
-        if len(self.logs) > 10000:
-            self.logs = self.logs[-10000:]
+    def _migrate_legacy_log(self):
+        """Convert the old single-file JSON log into segments"""
+        if not self.log_path.exists() or any(self.segment_dir.glob("segment_*.jsonl")):
+            return
 
-        with open(self.log_path, 'w') as f:
-            json.dump(self.logs, f, indent=2)
+        try:
+            with open(self.log_path, 'r') as f:
+                legacy = json.load(f)
+        except:
+            legacy = []
+
+        for number, start in enumerate(range(0, len(legacy), AUDIT_SEGMENT_SIZE), 1):
+            chunk = legacy[start:start + AUDIT_SEGMENT_SIZE]
+            with open(self.segment_dir / f"segment_{number:08d}.jsonl", 'w') as f:
+                f.write("".join(json.dumps(entry) + "\n" for entry in chunk))
+
+        self.log_path.rename(self.log_path.with_suffix(".json.migrated"))
+
+    def _new_segment_path(self) -> Path:
+        """Path for the next segment file"""
+        existing = sorted(self.segment_dir.glob("segment_*.jsonl"))
+        last = int(existing[-1].stem.split("_")[1]) if existing else 0
+        return self.segment_dir / f"segment_{last + 1:08d}.jsonl"
+
+    def _append_to_segments(self, entries: List[Dict]):
+        """Write the oldest pending entries, rolling over when a segment is full"""
+        while entries:
+            if not self.segments or len(self.segments[-1]["offsets"]) >= AUDIT_SEGMENT_SIZE:
+                segment = self._new_segment(self._new_segment_path())
+                with self.lock:
+                    self.segments.append(segment)
+
+            segment = self.segments[-1]
+            room = AUDIT_SEGMENT_SIZE - len(segment["offsets"])
+            chunk, entries = entries[:room], entries[room:]
+            lines = [(json.dumps(entry) + "\n").encode("utf-8") for entry in chunk]
+
+            with open(segment["path"], 'ab') as f:
+                f.write(b"".join(lines))
+
+            # Publish the offsets and release the entries from memory together
+            with self.lock:
+                for entry, line in zip(chunk, lines):
+                    self._add_to_segment(segment, segment["size"], entry)
+                    segment["size"] += len(line)
+                self.flushed_seq += len(chunk)
+                del self.pending[:len(chunk)]
+
+    def _drop_oldest_segment(self):
+        """Delete the oldest segment file and its index entries"""
+        with self.lock:
+            dropped = self.segments.pop(0)
+            self._unindex_head(self.user_index, dropped["users"])
+            self._unindex_head(self.action_index, dropped["actions"])
+            self.base_seq += len(dropped["offsets"])
+        try:
+            dropped["path"].unlink()
+        except OSError:
+            pass
+
+    def _index_entry(self, seq: int, entry: Dict):
+        """Add an entry's sequence number to the secondary indexes"""
+        self.user_index[entry.get("username")].append(seq)
+        self.action_index[entry.get("action")].append(seq)
+
+    @staticmethod
+    def _unindex_head(index: Dict[str, array], counts: Counter):
+        """Remove the oldest sequence numbers for each key"""
+        for key, count in counts.items():
+            seqs = index.get(key)
+            if seqs is None:
+                continue
+            del seqs[:count]
+            if not seqs:
+                del index[key]
+
+    def _read_entries(self, seqs: List[int]) -> List[Dict]:
+        """Fetch entries by sequence number (call with self.lock held)"""
+        entries = []
+        files = {}
+        try:
+            for seq in seqs:
+                if seq >= self.flushed_seq:
+                    entries.append(self.pending[seq - self.flushed_seq])
+                    continue
+                segment = self.segments[
+                    bisect_right(self.segments, seq, key=lambda s: s["first_seq"]) - 1
+                ]
+                f = files.get(segment["path"])
+                if f is None:
+                    f = files[segment["path"]] = open(segment["path"], 'rb')
+                f.seek(segment["offsets"][seq - segment["first_seq"]])
+                entries.append(json.loads(f.readline()))
+        finally:
+            for f in files.values():
+                f.close()
+        return entries
+
+    def _timestamp(self, seq: int) -> str:
+        return self._read_entries([seq])[0].get("timestamp", "")
+
+    def _writer_loop(self):
+        """Flush pending entries in batches on a size or time threshold"""
+        while True:
+            item = self.queue.get()
+            received = 1
+            queued = 1 if item is not None else 0
+            deadline = time.monotonic() + AUDIT_FLUSH_INTERVAL
+
+            # A None item is a flush request: write what we have right away
+            while item is not None and queued < AUDIT_FLUSH_BATCH_SIZE:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    item = self.queue.get(timeout=remaining)
+                except queue.Empty:
+                    break
+                received += 1
+                if item is not None:
+                    queued += 1
+
+            # Entries stay pending (and queryable) until written, so a failed
+            # write is retried with the next batch
+            try:
+                with self.segment_lock:
+                    with self.lock:
+                        batch = list(self.pending)
+                    self._append_to_segments(batch)
+                    while len(self.segments) > AUDIT_MAX_SEGMENTS:
+                        self._drop_oldest_segment()
+            except Exception as e:
+                print(f"[AUDIT] Failed to write audit logs: {e}")
+
+            for _ in range(received):
+                self.queue.task_done()
+
+    def flush(self):
+        """Block until every queued entry has been written to disk"""
+        self.queue.put(None)
+        self.queue.join()
 
     def log_action(self, username: str, action: str, details: str = None,
                   ip_address: str = None, endpoint: str = None, method: str = None):
@@ -234,57 +636,153 @@ class AuditLogger:
             "method": method
         }
 
-        self.logs.append(log_entry)
-        self._save_logs()
+        with self.lock:
+            self._index_entry(self.flushed_seq + len(self.pending), log_entry)
+            self.pending.append(log_entry)
+        self.queue.put(log_entry)
 
         # Also print to console for debugging
         print(f"[AUDIT] {username} - {action} - {details or 'No details'}")
 
+    def query_logs(self, username: str = None, action: str = None,
+                   since: str = None, until: str = None,
+                   cursor: str = None, limit: int = 100) -> Dict:
+        """
+        Query logs newest first with optional filters and cursor pagination.
+
+        Args:
+            username: Only entries by this user
+            action: Only entries with this action
+            since: ISO timestamp, inclusive lower bound
+            until: ISO timestamp, inclusive upper bound
+            cursor: Opaque cursor returned by a previous call
+            limit: Maximum entries to return
+
+        Returns:
+            {"logs": [...], "next_cursor": str or None}
+        """
+        since = datetime.fromisoformat(since).isoformat() if since else None
+        until = datetime.fromisoformat(until).isoformat() if until else None
+        limit = max(limit, 0)
+        before = None
+        if cursor:
+            position = decode_cursor(cursor)
+            # ["audit", seq]: entries strictly older than seq
+            if (not isinstance(position, list) or len(position) != 2 or position[0] != "audit"
+                    or not isinstance(position[1], int) or isinstance(position[1], bool)
+                    or position[1] < 0):
+                raise ValueError("Invalid cursor")
+            before = position[1]
+
+        with self.lock:
+            # Sequence range [lo, hi) from the time bounds and cursor
+            retained = range(self.base_seq, self.flushed_seq + len(self.pending))
+            lo, hi = retained.start, retained.stop
+            if since:
+                lo += bisect_left(retained, since, key=self._timestamp)
+            if until:
+                hi = retained.start + bisect_right(retained, until, key=self._timestamp)
+            if before is not None:
+                hi = min(hi, before)
+
+            # Walk the narrowest index backwards from hi; with both filters,
+            # membership in the other index is checked by binary search
+            other = None
+            if username is not None and action is not None:
+                seqs, other = sorted(
+                    (self.user_index.get(username, []), self.action_index.get(action, [])),
+                    key=len
+                )
+            elif username is not None:
+                seqs = self.user_index.get(username, [])
+            elif action is not None:
+                seqs = self.action_index.get(action, [])
+            else:
+                seqs = retained
+
+            matched = []
+            i = bisect_left(seqs, hi) - 1
+            while i >= 0 and seqs[i] >= lo and len(matched) <= limit:
+                seq = seqs[i]
+                i -= 1
+                if other is not None:
+                    j = bisect_left(other, seq)
+                    if j == len(other) or other[j] != seq:
+                        continue
+                matched.append(seq)
+
+            next_cursor = None
+            if len(matched) > limit:
+                del matched[limit:]
+                if matched:
+                    next_cursor = encode_cursor(["audit", matched[-1]])
+            results = self._read_entries(matched)
+
+        return {"logs": results, "next_cursor": next_cursor}
+
     def get_user_logs(self, username: str, limit: int = 100) -> List[Dict]:
         """Get logs for a specific user"""
-        user_logs = [log for log in self.logs if log.get("username") == username]
-        return user_logs[-limit:]
+        return self.query_logs(username=username, limit=limit)["logs"][::-1]
 
     def get_recent_logs(self, limit: int = 100) -> List[Dict]:
         """Get recent audit logs"""
-        return self.logs[-limit:]
+        return self.query_logs(limit=limit)["logs"][::-1] if limit > 0 else []
 
     def get_logs_by_action(self, action: str, limit: int = 100) -> List[Dict]:
         """Get logs filtered by action type"""
-        action_logs = [log for log in self.logs if log.get("action") == action]
-        return action_logs[-limit:]
+        return self.query_logs(action=action, limit=limit)["logs"][::-1]
 
     def clear_old_logs(self, days: int = 90):
-        """Clear logs older than specified days"""
+        """Clear logs older than specified days
+
+        Works at segment granularity: a segment is dropped once its newest
+        entry is older than the cutoff.
+        """
         cutoff = datetime.now() - timedelta(days=days)
-        self.logs = [
-            log for log in self.logs
-            if datetime.fromisoformat(log["timestamp"]) > cutoff
-        ]
-        self._save_logs()
+        self.flush()
+
+        with self.segment_lock:
+            while (self.segments and self.segments[0]["last_timestamp"] and
+                   datetime.fromisoformat(self.segments[0]["last_timestamp"]) <= cutoff):
+                self._drop_oldest_segment()
 
 
 # Initialize global instances
 user_manager = UserManager()
 audit_logger = AuditLogger()
+login_limiter = TokenBucketLimiter(LOGIN_BUCKET_CAPACITY, LOGIN_BUCKET_REFILL_PER_SECOND)
 
 
 # FastAPI dependency functions
-async def get_current_user(credentials: HTTPAuthorizationCredentials = Depends(security)) -> Dict:
-    """Dependency to get the current authenticated user"""
-    token = credentials.credentials
-    payload = user_manager.verify_token(token)
+def _resolve_request_user(request: Request) -> Optional[Dict]:
+    """Resolve the request's user once and keep it on request.state"""
+    try:
+        return request.state.user
+    except AttributeError:
+        pass
+
+    user = None
+    auth_header = request.headers.get("Authorization")
+    if auth_header and auth_header.startswith("Bearer "):
+        principal = user_manager.resolve_token(auth_header.split(" ")[1])
+        # Copy once so a handler can't mutate the cached principal
+        user = dict(principal) if principal else None
 
-    if not payload:
-        raise HTTPException(status_code=401, detail="Invalid or expired token")
+    request.state.user = user
+    return user
 
-    username = payload.get("sub")
-    user = user_manager.get_user(username)
+
+async def get_current_user(
+    request: Request,
+    credentials: HTTPAuthorizationCredentials = Depends(security)
+) -> Dict:
+    """Dependency to get the current authenticated user"""
+    user = _resolve_request_user(request)
 
     if not user:
-        raise HTTPException(status_code=401, detail="User not found")
+        raise HTTPException(status_code=401, detail="Invalid or expired token")
 
-    return {**user, "username": username}
+    return user
 
 
 def require_permission(permission: str):
@@ -303,15 +801,4 @@ def require_permission(permission: str):
 # Helper function for optional authentication
 async def get_optional_user(request: Request) -> Optional[Dict]:
     """Get current user if authenticated, otherwise return None"""
-    auth_header = request.headers.get("Authorization")
-    if not auth_header or not auth_header.startswith("Bearer "):
-        return None
-
-    token = auth_header.split(" ")[1]
-    payload = user_manager.verify_token(token)
-
-    if payload:
-        username = payload.get("sub")
-        return {**user_manager.get_user(username), "username": username}
-
-    return None
\ No newline at end of file
+    return _resolve_request_user(request)
@@ -0,0 +1,249 @@
+"""
+Caption Duplicate Index
+Normalized-text hashes for exact duplicates and MinHash/LSH for near-duplicates
+"""
+
+import hashlib
+import re
+import unicodedata
+from collections import defaultdict
+from itertools import chain
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+# MinHash / LSH settings
+MINHASH_PERMUTATIONS = 64
+LSH_BANDS = 16                   # 16 bands x 4 rows: ~0.5 similarity pairs usually share a bucket
+NEAR_DUPLICATE_THRESHOLD = 0.8   # Estimated Jaccard similarity to count as a near-duplicate
+NEAR_DUPLICATE_CANDIDATES = 50   # Max bucket neighbours verified per inserted caption
+SHINGLE_SIZE = 4                 # Character shingle length
+
+WORD_PATTERN = re.compile(r"[^\W_]+")
+_PRIME = (1 << 31) - 1
+_SHINGLE_BASE = np.uint64(1000003)
+_random = np.random.RandomState(20240917)
+_PERM_A = _random.randint(1, _PRIME, size=MINHASH_PERMUTATIONS).astype(np.uint64)
+_PERM_B = _random.randint(0, _PRIME, size=MINHASH_PERMUTATIONS).astype(np.uint64)
+
+
+def normalize_text(text: str) -> str:
+    """Case-fold, NFKC-normalize and collapse whitespace."""
+    return " ".join(unicodedata.normalize("NFKC", text or "").casefold().split())
+
+
+def text_fingerprint(text: str) -> bytes:
+    """Hash of the normalized text; equal for exact duplicates."""
+    return hashlib.blake2b(normalize_text(text).encode("utf-8"), digest_size=16).digest()
+
+
+def minhash_signature(text: str) -> Optional[np.ndarray]:
+    """
+    MinHash signature over character shingles of the caption's words.
+
+    Emoji and punctuation are dropped first, so captions differing only in
+    those share a signature. Returns None for captions with no words.
+    """
+    words = " ".join(WORD_PATTERN.findall(normalize_text(text)))
+    if not words:
+        return None
+
+    # Polynomial hash of every SHINGLE_SIZE-codepoint window, vectorized
+    codepoints = np.frombuffer(words.encode("utf-32-le"), dtype=np.uint32).astype(np.uint64)
+    width = min(SHINGLE_SIZE, len(codepoints))
+    hashes = np.zeros(len(codepoints) - width + 1, dtype=np.uint64)
+    for offset in range(width):
+        hashes = (hashes * _SHINGLE_BASE + codepoints[offset:offset + len(hashes)]) % _PRIME
+
+    return ((_PERM_A[:, None] * hashes[None, :] + _PERM_B[:, None]) % _PRIME).min(axis=1)
+
+
+def _band_keys(signature: np.ndarray) -> List[tuple]:
+    return [(band, rows.tobytes()) for band, rows in enumerate(signature.reshape(LSH_BANDS, -1))]
+
+
+def dedup_terms(text: str) -> Tuple[bytes, Optional[np.ndarray], List[tuple]]:
+    """Fingerprint, MinHash signature and LSH band keys, as CaptionDuplicateIndex.add indexes them."""
+    signature = minhash_signature(text)
+    return text_fingerprint(text), signature, _band_keys(signature) if signature is not None else []
+
+
+class CaptionDuplicateIndex:
+    """
+    Exact and near-duplicate lookup for captions.
+
+    Exact duplicates are found through a normalized-text hash. Near
+    duplicates use MinHash signatures split into LSH bands, so an insert
+    only compares against captions sharing a band bucket.
+    """
+
+    def __init__(self):
+        self.exact_index: Dict[bytes, Dict[str, None]] = {}
+        self.fingerprints: Dict[str, bytes] = {}
+        self.signatures: Dict[str, np.ndarray] = {}
+        self.buckets: Dict[tuple, Dict[str, None]] = defaultdict(dict)
+
+    def find_exact(self, text: str, fingerprint: Optional[bytes] = None) -> Optional[str]:
+        """Id of a stored caption with the same normalized text (or fingerprint)."""
+        ids = self.exact_index.get(fingerprint or text_fingerprint(text))
+        return next(iter(ids)) if ids else None
+
+    def add(self, caption_id: str, text: str,
+            terms: Optional[Tuple[bytes, Optional[np.ndarray], List[tuple]]] = None) -> List[str]:
+        """
+        Index a caption.
+
+        terms is dedup_terms(text) when it was already computed, e.g. in a
+        worker thread. Near-duplicates are then not looked up here (the
+        caller checked them with near_duplicate_flags) and [] is returned.
+
+        Returns:
+            Ids of already indexed near-duplicates (similarity at or above
+            NEAR_DUPLICATE_THRESHOLD), checking at most
+            NEAR_DUPLICATE_CANDIDATES bucket neighbours.
+        """
+        if caption_id in self.fingerprints:
+            self.remove(caption_id)
+
+        check_near = terms is None
+        fingerprint, signature, band_keys = terms or dedup_terms(text)
+        self.fingerprints[caption_id] = fingerprint
+        self.exact_index.setdefault(fingerprint, {})[caption_id] = None
+
+        if signature is None:
+            return []
+        if not check_near:
+            for key in band_keys:
+                self.buckets[key][caption_id] = None
+            self.signatures[caption_id] = signature
+            return []
+
+        candidates: Dict[str, None] = {}
+        for key in band_keys:
+            bucket = self.buckets[key]
+            for other_id in bucket:
+                if len(candidates) >= NEAR_DUPLICATE_CANDIDATES:
+                    break
+                candidates[other_id] = None
+            bucket[caption_id] = None
+        self.signatures[caption_id] = signature
+        if not candidates:
+            return []
+
+        # Verify all candidates with one vectorized comparison
+        candidate_ids = list(candidates)
+        others = np.stack([self.signatures[other_id] for other_id in candidate_ids])
+        agreement = np.count_nonzero(others == signature, axis=1) / MINHASH_PERMUTATIONS
+        return [
+            other_id for other_id, score in zip(candidate_ids, agreement)
+            if score >= NEAR_DUPLICATE_THRESHOLD
+        ]
+
+    def near_duplicate_flags(self, batch: List[Tuple[bytes, Optional[np.ndarray], List[tuple]]]
+                             ) -> List[Optional[bool]]:
+        """
+        Check a batch of dedup_terms against the index and the batch's earlier rows.
+
+        Only reads the index, copying each bucket before walking it, so it
+        can run in a worker thread while the event loop keeps changing it
+        (the flags may then miss a caption added meanwhile).
+
+        Returns:
+            Per row: None for an exact duplicate (which an insert skips),
+            otherwise whether it has a near-duplicate, checking at most
+            NEAR_DUPLICATE_CANDIDATES bucket neighbours like add.
+        """
+        flags: List[Optional[bool]] = []
+        seen = set()
+        batch_buckets: Dict[tuple, List[np.ndarray]] = defaultdict(list)
+        for fingerprint, signature, band_keys in batch:
+            if fingerprint in seen or self.exact_index.get(fingerprint):
+                flags.append(None)
+                continue
+            seen.add(fingerprint)
+            if signature is None:
+                flags.append(False)
+                continue
+
+            candidates: Dict[int, np.ndarray] = {}
+            for key in band_keys:
+                stored = map(self.signatures.get, list(self.buckets.get(key, ())))
+                for other in chain(stored, batch_buckets[key]):
+                    if len(candidates) >= NEAR_DUPLICATE_CANDIDATES:
+                        break
+                    if other is not None:  # Removed since the bucket was copied
+                        candidates[id(other)] = other
+                batch_buckets[key].append(signature)
+
+            if not candidates:
+                flags.append(False)
+                continue
+            others = np.stack(list(candidates.values()))
+            agreement = np.count_nonzero(others == signature, axis=1) / MINHASH_PERMUTATIONS
+            flags.append(bool((agreement >= NEAR_DUPLICATE_THRESHOLD).any()))
+        return flags
+
+    def remove(self, caption_id: str):
+        """Drop a caption from both indexes."""
+        fingerprint = self.fingerprints.pop(caption_id, None)
+        if fingerprint is not None:
+            ids = self.exact_index.get(fingerprint)
+            if ids is not None:
+                ids.pop(caption_id, None)
+                if not ids:
+                    del self.exact_index[fingerprint]
+
+        signature = self.signatures.pop(caption_id, None)
+        if signature is not None:
+            for key in _band_keys(signature):
+                bucket = self.buckets.get(key)
+                if bucket is not None:
+                    bucket.pop(caption_id, None)
+                    if not bucket:
+                        del self.buckets[key]
+
+    def similarity(self, first_id: str, second_id: str) -> float:
+        """Estimated Jaccard similarity of two indexed captions."""
+        first = self.signatures.get(first_id)
+        second = self.signatures.get(second_id)
+        if first is None or second is None:
+            return 1.0 if self.fingerprints.get(first_id) == self.fingerprints.get(second_id) else 0.0
+        return float(np.count_nonzero(first == second)) / MINHASH_PERMUTATIONS
+
+    def groups(self, threshold: float = NEAR_DUPLICATE_THRESHOLD) -> List[List[str]]:
+        """
+        Group captions that are exact or near duplicates of each other.
+
+        Each bucket member is compared with the bucket's first member, so the
+        cost is linear in total bucket size rather than quadratic.
+        """
+        parent: Dict[str, str] = {}
+
+        def find(item: str) -> str:
+            root = parent.setdefault(item, item)
+            while root != parent[root]:
+                root = parent[root]
+            while item != root:
+                parent[item], item = root, parent[item]
+            return root
+
+        def union(first: str, second: str):
+            parent[find(second)] = find(first)
+
+        for ids in self.exact_index.values():
+            if len(ids) > 1:
+                anchor, *rest = ids
+                for other_id in rest:
+                    union(anchor, other_id)
+
+        for bucket in self.buckets.values():
+            if len(bucket) > 1:
+                anchor, *rest = bucket
+                for other_id in rest:
+                    if self.similarity(anchor, other_id) >= threshold:
+                        union(anchor, other_id)
+
+        grouped: Dict[str, List[str]] = defaultdict(list)
+        for caption_id in parent:
+            grouped[find(caption_id)].append(caption_id)
+        return [members for members in grouped.values() if len(members) > 1]
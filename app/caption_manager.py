@@ -3,20 +3,240 @@ Caption Manager - Handles Excel file processing and caption storage
 """
 
 import pandas as pd
+import copy
+import csv
+import heapq
 import json
 import uuid
 from pathlib import Path
 from datetime import datetime
-from typing import Dict, List, Optional
+from typing import BinaryIO, Dict, Iterable, Iterator, List, Optional, Tuple
 import io
+import os
+import time
+from collections import deque
+from itertools import islice
+from openpyxl import Workbook, load_workbook
+from app.caption_dedup import CaptionDuplicateIndex, NEAR_DUPLICATE_THRESHOLD, dedup_terms
+from app.caption_search import CaptionSearchIndex, index_terms
+from app.paging import decode_cursor, encode_cursor, is_int, valid_sort_position
+from app.sorted_index import SortedIndex
+from app.usage_log import UsageEventLog, write_json_atomic
+
+# Paging
+CAPTION_SORTS = ("default", "created_at", "usage")  # default = insertion order
+CAPTION_PAGE_MAX = 500
+CATEGORY_DIRECT_RATIO = 8  # Sort a category's own ids when it holds under 1/8 of all captions
+
+# Delta sync
+CAPTION_CHANGELOG_SIZE = 5000  # Changes kept for /api/captions/changes
+
+# Upload merge
+CAPTION_MERGE_CHUNK = 1000  # Rows indexed per merge_parsed step
+
+# Excel ingest
+EXCEL_STREAMING_MIN_BYTES = 2 * 1024 * 1024  # Stream .xlsx uploads at least this large
+EXCEL_CHUNK_ROWS = 50000                      # Rows per chunk when streaming
+
+# Export
+EXPORT_FORMATS = {  # format -> (media type, file extension)
+    "xlsx": ("application/vnd.openxmlformats-officedocument.spreadsheetml.sheet", "xlsx"),
+    "csv": ("text/csv; charset=utf-8", "csv"),
+    "ndjson": ("application/x-ndjson", "ndjson"),
+}
+EXPORT_COLUMNS = ["Category", "Caption", "Usage Count", "Created", "Source"]
+EXPORT_BUFFER_BYTES = 64 * 1024  # Text formats are written in chunks of about this size
+
+# Lowercased spellings -> canonical category names
+CATEGORY_MAP = {
+    "tip": "Tip Prompt",
+    "tips": "Tip Prompt",
+    "tip prompt": "Tip Prompt",
+    "mass": "Mass Message",
+    "mass msg": "Mass Message",
+    "mass message": "Mass Message",
+    "live": "LIVE BOOST",
+    "live boost": "LIVE BOOST",
+    "livestream": "LIVE BOOST",
+    "unlock": "Unlock Prompt",
+    "unlocks": "Unlock Prompt",
+    "unlock prompt": "Unlock Prompt",
+    "bundle": "Bundle Prompt",
+    "bundles": "Bundle Prompt",
+    "bundle prompt": "Bundle Prompt",
+    "ppv": "PPV Captions",
+    "ppv caption": "PPV Captions",
+    "ppv captions": "PPV Captions",
+    "campaign": "Campaign Ideas",
+    "campaigns": "Campaign Ideas",
+    "campaign ideas": "Campaign Ideas",
+    "general": "General",
+    "other": "General"
+}
+
+
+def _as_tuple(value):
+    """Turn JSON lists back into the (nested) tuples used as sort keys."""
+    return tuple(_as_tuple(v) for v in value) if isinstance(value, list) else value
+
+
+def _valid_sort_key(sort: str, key) -> bool:
+    """Whether a cursor key has the shape sort uses."""
+    if sort == "default":
+        return is_int(key)
+    if not isinstance(key, list) or len(key) != 2 or not is_int(key[1]):
+        return False
+    return isinstance(key[0], str) if sort == "created_at" else is_int(key[0])
+
+
+def _project(captions: List[Dict], fields: List[str]) -> List[Dict]:
+    """Copy captions keeping only the given fields (and id)."""
+    wanted = set(fields) | {"id"}
+    return [{k: v for k, v in caption.items() if k in wanted} for caption in captions]
+
+
+def _bulk_uuid4(count: int) -> List[str]:
+    """Generate count random UUID4 strings from a single entropy read."""
+    raw = os.urandom(16 * count)
+    return [str(uuid.UUID(bytes=raw[i:i + 16], version=4)) for i in range(0, 16 * count, 16)]
+
 
 class CaptionManager:
+    # Attributes making up the caption store; replace_store swaps them together
+    STORE_ATTRIBUTES = (
+        "captions", "category_index", "search_index", "duplicate_index",
+        "insert_seq", "next_seq", "order_index", "usage_index", "recency_index"
+    )
+
     def __init__(self, storage_path: str = "data/captions.json"):
         """Initialize the Caption Manager with persistent storage."""
         self.storage_path = Path(storage_path)
         self.storage_path.parent.mkdir(exist_ok=True)
-        self.captions = self._load_captions()
-        self._ensure_ids()  # Ensure all captions have IDs
+
+        self._reset_store()
+
+        # Version bumped on every structural change (not usage bumps), plus a
+        # bounded log of (version, op, caption_id). Starting from the clock
+        # keeps versions increasing across restarts; changelog_base is the
+        # oldest version the log can answer "since" queries for.
+        self.version = time.time_ns() // 1000
+        self.changelog = deque(maxlen=CAPTION_CHANGELOG_SIZE)
+        self.changelog_base = self.version
+        self.usage_version = 0  # Bumped per usage bump, for ETags
+
+        # Saves are numbered so a background write can't replace a newer file
+        self.save_generation = 0
+        self.saved_generation = 0
+
+        # Usage bumps are appended here and folded into captions.json later
+        self.usage_log = UsageEventLog(
+            self.storage_path.with_suffix(".usage.jsonl"), compact=self._save_captions
+        )
+
+        loaded = self._load_captions()
+        self._ensure_ids(loaded)  # Ensure all captions have unique IDs
+        for caption in loaded:
+            self._add_to_store(caption, sorted_views=False)
+        self._add_sorted_views(loaded)
+
+        replayed = False
+        for event in self.usage_log.replay():
+            # Saves keep each caption's last_used, so events already folded
+            # into the file are skipped
+            caption = self.captions.get(event["id"])
+            if caption is not None and event.get("ts") and event["ts"] <= caption.get("last_used", ""):
+                continue
+            replayed = self._apply_usage(event["id"], event.get("ts")) or replayed
+        if replayed:
+            self._save_captions()
+        else:
+            self.usage_log.reset()
+
+    def _reset_store(self):
+        """Start an empty caption store and indexes."""
+        # Captions keyed by id, in insertion order, plus category -> ordered id set
+        self.captions: Dict[str, Dict] = {}
+        self.category_index: Dict[str, Dict[str, None]] = {}
+        self.search_index = CaptionSearchIndex()
+        self.duplicate_index = CaptionDuplicateIndex()
+
+        # Ordered views for top-K reads; insertion sequence breaks ties so
+        # equal keys keep the order the captions were added in
+        self.insert_seq: Dict[str, int] = {}
+        self.next_seq = 0
+        self.order_index = SortedIndex()
+        self.usage_index = SortedIndex()
+        self.recency_index = SortedIndex()
+
+    def _reset_changelog(self):
+        """Bump the version and drop the changelog; clients must refetch."""
+        self.version += 1
+        self.changelog.clear()
+        self.changelog_base = self.version
+
+    def _record_change(self, op: str, caption_id: str):
+        """Bump the version and log a change (op is insert, update or delete)."""
+        self.version += 1
+        if len(self.changelog) == self.changelog.maxlen:
+            self.changelog_base = self.changelog[0][0]
+        self.changelog.append((self.version, op, caption_id))
+
+    def _add_to_store(self, caption: Dict, sorted_views: bool = True,
+                      terms: Optional[Tuple] = None) -> List[str]:
+        """
+        Insert a caption and index it; returns ids of near-duplicates.
+
+        Batches pass sorted_views=False and call _add_sorted_views once at
+        the end, so the ordered views are sorted once instead of per caption.
+        terms is (search terms, duplicate terms) from prepare_parsed, if computed.
+        """
+        self.captions[caption["id"]] = caption
+        self.insert_seq[caption["id"]] = self.next_seq
+        self.next_seq += 1
+        return self._index_caption(caption, sorted_views, terms)
+
+    def _remove_from_store(self, caption_id: str) -> Optional[Dict]:
+        """Remove a caption and its index entries."""
+        caption = self.captions.pop(caption_id, None)
+        if caption is not None:
+            self._unindex_caption(caption)
+            del self.insert_seq[caption_id]
+        return caption
+
+    def _usage_key(self, caption: Dict):
+        return (caption.get("usage_count", 0), -self.insert_seq[caption["id"]])
+
+    def _recency_key(self, caption: Dict):
+        return (caption.get("created_at", ""), -self.insert_seq[caption["id"]])
+
+    def _index_caption(self, caption: Dict, sorted_views: bool = True,
+                       terms: Optional[Tuple] = None) -> List[str]:
+        """Add a caption to the secondary indexes; returns ids of near-duplicates."""
+        search_terms, duplicate_terms = terms or (None, None)
+        self.category_index.setdefault(caption["category"], {})[caption["id"]] = None
+        self.search_index.add(caption["id"], caption["text"], search_terms)
+        if sorted_views:
+            self._add_sorted_views([caption])
+        return self.duplicate_index.add(caption["id"], caption["text"], duplicate_terms)
+
+    def _add_sorted_views(self, captions: List[Dict]):
+        """Add captions to the order, usage and recency views."""
+        self.order_index.add_many((self.insert_seq[c["id"]], c["id"]) for c in captions)
+        self.usage_index.add_many((self._usage_key(c), c["id"]) for c in captions)
+        self.recency_index.add_many((self._recency_key(c), c["id"]) for c in captions)
+
+    def _unindex_caption(self, caption: Dict):
+        """Remove a caption from the secondary indexes."""
+        ids = self.category_index.get(caption["category"])
+        if ids is not None:
+            ids.pop(caption["id"], None)
+            if not ids:
+                del self.category_index[caption["category"]]
+        self.search_index.remove(caption["id"])
+        self.duplicate_index.remove(caption["id"])
+        self.order_index.remove(self.insert_seq[caption["id"]], caption["id"])
+        self.usage_index.remove(self._usage_key(caption), caption["id"])
+        self.recency_index.remove(self._recency_key(caption), caption["id"])
 
     def _load_captions(self) -> List[Dict]:
         """Load captions from storage file."""
@@ -29,15 +249,20 @@ class CaptionManager:
         return []
 
     def _save_captions(self):
-        """Save captions to storage file."""
-        with open(self.storage_path, 'w', encoding='utf-8') as f:
-            json.dump(self.captions, f, indent=2, ensure_ascii=False)
-
-    def _ensure_ids(self):
+        """Save captions to storage file (this also compacts the usage log)."""
+        self.save_generation += 1
+        write_json_atomic(self.storage_path, list(self.captions.values()),
+                          indent=2, ensure_ascii=False)
+        self.saved_generation = self.save_generation
+        self.usage_log.reset()
+
+    def _ensure_ids(self, captions: List[Dict]):
         """Ensure all captions have unique IDs."""
-        for caption in self.captions:
-            if 'id' not in caption or not caption['id']:
+        seen = set()
+        for caption in captions:
+            if 'id' not in caption or not caption['id'] or caption['id'] in seen:
                 caption['id'] = str(uuid.uuid4())
+            seen.add(caption['id'])
 
     def process_excel_file(self, file_content: bytes, filename: str) -> Dict:
         """
@@ -50,74 +275,49 @@ class CaptionManager:
         Returns:
         - Dictionary with processing results
         """
-        try:
-            # Read Excel file from bytes
-            df = pd.read_excel(io.BytesIO(file_content))
+        result = self.parse_excel_file(file_content, filename)
+        if result["success"]:
+            self.store_parsed_captions(result)
+        return result
 
-            # Get column names (first two columns)
-            columns = df.columns.tolist()
-
-            # If columns are named, use them; otherwise use index
-            if len(columns) >= 2:
-                category_col = df.iloc[:, 0]  # First column
-                message_col = df.iloc[:, 1]   # Second column
-            else:
-                raise ValueError("Excel file must have at least 2 columns")
+    def parse_excel_file(self, file_content: bytes, filename: str) -> Dict:
+        """
+        Read captions from an Excel file without storing them.
 
-            # Process and organize captions
-            caption_data = {}
+        Touches no manager state, so it can run in a worker thread; pass the
+        result to store_parsed_captions afterwards. Large .xlsx files are streamed
+        with a read-only openpyxl workbook in fixed-size row chunks.
+        """
+        try:
+            created_at = datetime.now().isoformat()
             new_captions = []
-            categories_found = set()
-
-            for index in range(len(df)):
-                try:
-                    category = str(category_col.iloc[index]).strip() if pd.notna(category_col.iloc[index]) else None
-                    message = str(message_col.iloc[index]).strip() if pd.notna(message_col.iloc[index]) else None
-
-                    # Skip rows with empty messages
-                    if not message or message == 'nan':
-                        continue
-
-                    # Use default category if not specified
-                    if not category or category == 'nan':
-                        category = "General"
-
-                    # Normalize category names
-                    category = self._normalize_category(category)
-                    categories_found.add(category)
-
-                    # Add to caption data
-                    if category not in caption_data:
-                        caption_data[category] = []
-                    caption_data[category].append(message)
-
-                    # Create caption entry
-                    caption_entry = {
-                        "id": str(uuid.uuid4()),
-                        "text": message,
+            by_category: Dict[str, int] = {}
+
+            for categories, messages in self._read_excel_columns(file_content, filename):
+                texts, category_names = self._clean_caption_columns(categories, messages)
+                ids = _bulk_uuid4(len(texts))
+                new_captions.extend(
+                    {
+                        "id": caption_id,
+                        "text": text,
                         "category": category,
                         "source": filename,
-                        "created_at": datetime.now().isoformat(),
+                        "created_at": created_at,
                         "usage_count": 0
                     }
-                    new_captions.append(caption_entry)
-
-                except Exception as e:
-                    print(f"Error processing row {index}: {e}")
-                    continue
-
-            # Add new captions to storage
-            self.captions.extend(new_captions)
-            self._save_captions()
+                    for caption_id, text, category in zip(ids, texts, category_names)
+                )
+                for category, count in category_names.value_counts(sort=False).items():
+                    by_category[category] = by_category.get(category, 0) + int(count)
 
             return {
                 "success": True,
-                "message": f"Successfully processed {len(new_captions)} captions from {len(categories_found)} categories",
+                "message": f"Successfully processed {len(new_captions)} captions from {len(by_category)} categories",
                 "captions": new_captions,
-                "categories": list(categories_found),
+                "categories": list(by_category),
                 "summary": {
                     "total": len(new_captions),
-                    "by_category": {cat: len(msgs) for cat, msgs in caption_data.items()}
+                    "by_category": by_category
                 }
             }
 
@@ -128,89 +328,377 @@ class CaptionManager:
                 "captions": []
             }
 
-    def _normalize_category(self, category: str) -> str:
+    def store_parsed_captions(self, result: Dict) -> Dict:
         """
-        Normalize category names to match predefined categories.
+        Store the captions from a parse_excel_file result and save once.
+
+        Exact duplicates (of stored captions or earlier rows) are skipped and
+        near-duplicates are counted; the result is updated to describe only
+        the captions that were added.
         """
-        category_map = {
-            "tip": "Tip Prompt",
-            "tips": "Tip Prompt",
-            "tip prompt": "Tip Prompt",
-            "mass": "Mass Message",
-            "mass msg": "Mass Message",
-            "mass message": "Mass Message",
-            "live": "LIVE BOOST",
-            "live boost": "LIVE BOOST",
-            "livestream": "LIVE BOOST",
-            "unlock": "Unlock Prompt",
-            "unlocks": "Unlock Prompt",
-            "unlock prompt": "Unlock Prompt",
-            "bundle": "Bundle Prompt",
-            "bundles": "Bundle Prompt",
-            "bundle prompt": "Bundle Prompt",
-            "ppv": "PPV Captions",
-            "ppv caption": "PPV Captions",
-            "ppv captions": "PPV Captions",
-            "campaign": "Campaign Ideas",
-            "campaigns": "Campaign Ideas",
-            "campaign ideas": "Campaign Ideas",
-            "general": "General",
-            "other": "General"
-        }
+        for _ in self.merge_parsed(result):
+            pass
+        self._save_captions()
+        return result
+
+    def prepare_parsed(self, result: Dict) -> List[Tuple]:
+        """
+        Compute index terms and near-duplicate flags for a parse_excel_file result.
+
+        Only reads the store, so it can run in a worker thread; merge_parsed
+        then leaves just the new rows' index updates to the event loop.
+        """
+        texts = [caption["text"] for caption in result["captions"]]
+        duplicate_terms = [dedup_terms(text) for text in texts]
+        near = self.duplicate_index.near_duplicate_flags(duplicate_terms)
+        return list(zip(map(index_terms, texts), duplicate_terms, near))
+
+    def merge_parsed(self, result: Dict, terms: Optional[List[Tuple]] = None,
+                     record: bool = True) -> Iterator[None]:
+        """
+        Add a parse_excel_file result to the store, skipping exact duplicates.
+
+        A generator that indexes CAPTION_MERGE_CHUNK rows per step, so the
+        event loop can serve other requests between steps; the store is
+        consistent at every yield. Costs O(new rows) given prepare_parsed's
+        terms. The result is updated at the end to describe only the
+        captions that were added. Nothing is saved; see snapshot.
+        """
+        terms = terms if terms is not None else self.prepare_parsed(result)
+        rows = list(zip(result["captions"], terms))
+        added = []
+        by_category: Dict[str, int] = {}
+        near_duplicates = 0
+        for start in range(0, len(rows), CAPTION_MERGE_CHUNK):
+            chunk = []
+            for caption, (search_terms, duplicate_terms, near) in rows[start:start + CAPTION_MERGE_CHUNK]:
+                # Checked again here: the store may have changed since prepare_parsed
+                if self.duplicate_index.find_exact(caption["text"], duplicate_terms[0]) is not None:
+                    continue
+                self._add_to_store(caption, sorted_views=False, terms=(search_terms, duplicate_terms))
+                near_duplicates += bool(near)
+                chunk.append(caption)
+                by_category[caption["category"]] = by_category.get(caption["category"], 0) + 1
+            self._add_sorted_views(chunk)
+            if record:
+                for caption in chunk:
+                    self._record_change("insert", caption["id"])
+            added.extend(chunk)
+            yield
+
+        skipped = len(result["captions"]) - len(added)
+        message = f"Successfully processed {len(added)} captions from {len(by_category)} categories"
+        if skipped:
+            message += f" ({skipped} duplicates skipped)"
+        result.update({
+            "message": message,
+            "captions": added,
+            "categories": list(by_category),
+            "summary": {
+                "total": len(added),
+                "by_category": by_category,
+                "duplicates_skipped": skipped,
+                "near_duplicates": near_duplicates
+            }
+        })
+
+    def snapshot(self) -> Dict:
+        """Numbered reference list of the current captions, for write_snapshot."""
+        self.save_generation += 1
+        return {"generation": self.save_generation, "captions": list(self.captions.values())}
+
+    def write_snapshot(self, snapshot: Dict) -> Path:
+        """Write a snapshot to a temp file next to the storage file (worker thread)."""
+        path = self.storage_path.with_name(f"{self.storage_path.name}.{snapshot['generation']}.tmp")
+        # dict() copies each caption in one step, so a concurrent edit on the
+        # loop can't change a caption while it is being encoded
+        captions = [dict(caption) for caption in snapshot["captions"]]
+        try:
+            with open(path, 'w', encoding='utf-8') as f:
+                json.dump(captions, f, indent=2, ensure_ascii=False)
+        except BaseException:
+            path.unlink(missing_ok=True)
+            raise
+        return path
+
+    def commit_snapshot(self, snapshot: Dict, path: Path):
+        """
+        Rename a written snapshot into place, unless a newer save already landed.
+
+        The usage log is kept: events after the snapshot are only in the log,
+        and replay skips the ones the file already holds.
+        """
+        if snapshot["generation"] < self.saved_generation:
+            path.unlink(missing_ok=True)
+            return
+        os.replace(path, self.storage_path)
+        self.saved_generation = snapshot["generation"]
+
+    def build_replacement(self, result: Dict) -> "CaptionManager":
+        """
+        Build a complete replacement store from a parse_excel_file result.
+
+        Runs without touching the live store, so it can run in a worker
+        thread; the new set is also written to a temp file next to the
+        storage file. Pass the returned staging manager to replace_store.
+        """
+        staging = copy.copy(self)
+        staging._reset_store()
+        for _ in staging.merge_parsed(result, record=False):
+            pass
+        staging._write_staging_file(".replace.tmp")
+        return staging
+
+    def _write_staging_file(self, suffix: str):
+        """Write this (staging) store next to the storage file for a later rename."""
+        self.staging_path = self.storage_path.with_name(self.storage_path.name + suffix)
+        with open(self.staging_path, 'w', encoding='utf-8') as f:
+            json.dump(list(self.captions.values()), f, indent=2, ensure_ascii=False)
+
+    def replace_store(self, staging: "CaptionManager"):
+        """Swap in a store from build_replacement (rename + attribute swap)."""
+        os.replace(staging.staging_path, self.storage_path)
+        self.save_generation += 1
+        self.saved_generation = self.save_generation
+        for name in self.STORE_ATTRIBUTES:
+            setattr(self, name, getattr(staging, name))
+        self._reset_changelog()
+        # Any logged usage belonged to the old captions
+        self.usage_log.reset()
+
+    def _read_excel_columns(self, file_content: bytes, filename: str) -> Iterator[Tuple[pd.Series, pd.Series]]:
+        """Yield (category, message) column chunks from the first sheet."""
+        streamable = Path(filename or "").suffix.lower() in (".xlsx", ".xlsm")
+        if not streamable or len(file_content) < EXCEL_STREAMING_MIN_BYTES:
+            df = pd.read_excel(io.BytesIO(file_content))
+            if len(df.columns) < 2:
+                raise ValueError("Excel file must have at least 2 columns")
+            yield df.iloc[:, 0], df.iloc[:, 1]
+            return
+
+        workbook = load_workbook(io.BytesIO(file_content), read_only=True, data_only=True)
+        try:
+            sheet = workbook.worksheets[0]
+            rows = sheet.iter_rows(max_col=2, values_only=True)
+            # Read-only rows are padded to max_col, so check the header cells
+            header = next(rows, None)
+            if header is None or any(cell is None or str(cell).strip() == "" for cell in header):
+                raise ValueError("Excel file must have at least 2 columns")
+
+            while True:
+                chunk = list(islice(rows, EXCEL_CHUNK_ROWS))
+                if not chunk:
+                    break
+                frame = pd.DataFrame.from_records(chunk, columns=["category", "message"])
+                yield frame["category"], frame["message"]
+        finally:
+            workbook.close()
 
-        # Check if category matches any known mapping
-        lower_category = category.lower()
-        for key, value in category_map.items():
-            if lower_category == key:
-                return value
+    @staticmethod
+    def _clean_caption_columns(categories: pd.Series, messages: pd.Series) -> Tuple[List[str], pd.Series]:
+        """Strip, drop empty messages and normalize categories, column-wise."""
+        messages = messages[messages.notna()].astype(str).str.strip()
+        messages = messages[(messages != "") & (messages != "nan")]
 
+        categories = categories.reindex(messages.index)
+        categories = categories.where(categories.notna(), "").astype(str).str.strip()
+        categories = categories.mask(categories.isin(["", "nan"]), "General")
+        categories = categories.str.lower().map(CATEGORY_MAP).fillna(categories)
+
+        return messages.tolist(), categories
+
+    def _normalize_category(self, category: str) -> str:
+        """
+        Normalize category names to match predefined categories.
+        """
         # Return original category if no match found
-        return category
+        return CATEGORY_MAP.get(category.lower(), category)
 
     def get_all_captions(self) -> List[Dict]:
         """Get all stored captions."""
-        return self.captions
+        return list(self.captions.values())
 
     def get_captions_by_category(self, category: str) -> List[Dict]:
         """Get captions filtered by category."""
         if category == "All Categories":
-            return self.captions
-        return [c for c in self.captions if c["category"] == category]
+            return self.get_all_captions()
+        return [self.captions[i] for i in self.category_index.get(category, {})]
+
+    def search_captions(self, query: str, category: str = None,
+                        limit: int = None) -> List[Dict]:
+        """Search captions by text content, best matches first."""
+        allowed = None
+        if category and category != "All Categories":
+            allowed = self.category_index.get(category, {})
+        ids = self.search_index.search(query, allowed=allowed, limit=limit)
+        return [self.captions[i] for i in ids]
+
+    def get_captions_page(self, category: str = None, search: str = None, sort: str = "default",
+                          cursor: str = None, limit: int = 50, fields: List[str] = None) -> Dict:
+        """
+        Get one page of captions.
+
+        Args:
+            category: Optional category filter
+            search: Optional search text (results are ranked; sort is ignored)
+            sort: "default" (insertion order), "created_at" or "usage" (both newest/most first)
+            cursor: Opaque cursor from a previous page
+            limit: Page size (capped at CAPTION_PAGE_MAX)
+            fields: Optional list of fields to return (id is always included)
+
+        Returns:
+            {"captions": [...], "next_cursor": str or None, "total": int or None,
+             "version": int}
+
+        Raises:
+            ValueError: On an unknown sort or a malformed cursor
+        """
+        if sort not in CAPTION_SORTS:
+            raise ValueError(f"sort must be one of: {', '.join(CAPTION_SORTS)}")
+        limit = max(1, min(limit or 50, CAPTION_PAGE_MAX))
+        position = decode_cursor(cursor) if cursor else None
+        allowed = None
+        if category and category != "All Categories":
+            allowed = self.category_index.get(category, {})
+
+        if search:
+            # Ranked results: the cursor is an offset into the ranking
+            if position is not None and not (is_int(position) and position >= 0):
+                raise ValueError("Invalid cursor")
+            offset = position or 0
+            ids = self.search_index.search(search, allowed=allowed, limit=offset + limit + 1)
+            page_ids = ids[offset:offset + limit]
+            next_cursor = encode_cursor(offset + limit) if len(ids) > offset + limit else None
+            total = None
+        else:
+            if position is not None and not valid_sort_position(sort, position, _valid_sort_key):
+                raise ValueError("Invalid cursor")
+            after = (_as_tuple(position[1]), position[2]) if position else None
+
+            if allowed is not None and len(allowed) * CATEGORY_DIRECT_RATIO < len(self.captions):
+                # Small category: pick the page from its own ids instead of
+                # filtering a walk over the whole index
+                page = self._category_page(allowed, sort, after, limit + 1)
+            else:
+                if sort == "default":
+                    entries = self.order_index.iter_asc(after)
+                else:
+                    index = self.usage_index if sort == "usage" else self.recency_index
+                    entries = index.iter_desc(after)
+                if allowed is not None:
+                    entries = (entry for entry in entries if entry[1] in allowed) if allowed else iter(())
+                page = list(islice(entries, limit + 1))
+            page_ids = [caption_id for _, caption_id in page[:limit]]
+            next_cursor = None
+            if len(page) > limit:
+                key, caption_id = page[limit - 1]
+                next_cursor = encode_cursor([sort, key, caption_id])
+            total = len(allowed) if allowed is not None else len(self.captions)
+
+        captions = [self.captions[i] for i in page_ids]
+        if fields:
+            captions = _project(captions, fields)
+
+        return {"captions": captions, "next_cursor": next_cursor, "total": total, "version": self.version}
+
+    def _category_page(self, ids, sort: str, after, count: int) -> List[Tuple]:
+        """Next count (key, id) entries among ids, in the order get_captions_page uses."""
+        if sort == "default":
+            entries = ((self.insert_seq[i], i) for i in ids)
+            if after is not None:
+                entries = (entry for entry in entries if entry > after)
+            return heapq.nsmallest(count, entries)
+
+        key = self._usage_key if sort == "usage" else self._recency_key
+        entries = ((key(self.captions[i]), i) for i in ids)
+        if after is not None:
+            entries = (entry for entry in entries if entry < after)
+        return heapq.nlargest(count, entries)
+
+    def get_changes(self, since: int, fields: List[str] = None) -> Dict:
+        """
+        Get captions changed after a version.
+
+        Args:
+            since: Version the client last saw
+            fields: Optional list of fields to return (id is always included)
+
+        Returns:
+            {"version", "reset", "inserts", "updates", "deletes"}. inserts are
+            captions added after since (even if also changed later), updates
+            are captions that existed at since and changed, deletes are ids.
+            reset is True when the changelog no longer reaches back to since;
+            the client should then refetch from scratch.
+        """
+        if since < self.changelog_base or since > self.version:
+            return {"version": self.version, "reset": True, "inserts": [], "updates": [], "deletes": []}
+
+        # Newest op per caption, walking back from the end of the log
+        latest: Dict[str, str] = {}
+        inserted = set()
+        for version, op, caption_id in reversed(self.changelog):
+            if version <= since:
+                break
+            latest.setdefault(caption_id, op)
+            if op == "insert":
+                inserted.add(caption_id)
+
+        inserts = []
+        updates = []
+        deletes = []
+        for caption_id, op in latest.items():
+            caption = self.captions.get(caption_id)
+            if op == "delete" or caption is None:
+                deletes.append(caption_id)
+            elif caption_id in inserted:
+                inserts.append(caption)
+            else:
+                updates.append(caption)
+        if fields:
+            inserts = _project(inserts, fields)
+            updates = _project(updates, fields)
 
-    def search_captions(self, query: str) -> List[Dict]:
-        """Search captions by text content."""
-        query_lower = query.lower()
-        return [c for c in self.captions if query_lower in c["text"].lower()]
+        return {"version": self.version, "reset": False, "inserts": inserts,
+                "updates": updates, "deletes": deletes}
 
     def get_caption_by_id(self, caption_id: str) -> Optional[Dict]:
         """Get a specific caption by ID."""
-        for caption in self.captions:
-            if caption["id"] == caption_id:
-                return caption
-        return None
+        return self.captions.get(caption_id)
+
+    def _apply_usage(self, caption_id: str, timestamp: str) -> bool:
+        """Fold one usage event into the in-memory counters."""
+        caption = self.captions.get(caption_id)
+        if caption is None:
+            return False
+        old_key = self._usage_key(caption)
+        caption["usage_count"] = caption.get("usage_count", 0) + 1
+        self.usage_index.update(old_key, self._usage_key(caption), caption_id)
+        caption["last_used"] = timestamp or datetime.now().isoformat()
+        return True
 
     def increment_usage(self, caption_id: str):
         """Increment the usage count for a caption."""
-        for caption in self.captions:
-            if caption["id"] == caption_id:
-                caption["usage_count"] += 1
-                caption["last_used"] = datetime.now().isoformat()
-                self._save_captions()
-                return True
-        return False
+        if caption_id not in self.captions:
+            return False
+        timestamp = datetime.now().isoformat()
+        self._apply_usage(caption_id, timestamp)
+        # Not a structural change: clients reloading on version don't need it
+        self.usage_version += 1
+        self.usage_log.record(caption_id, "use", timestamp)
+        return True
 
     def delete_caption(self, caption_id: str) -> bool:
         """Delete a caption by ID."""
-        for i, caption in enumerate(self.captions):
-            if caption["id"] == caption_id:
-                self.captions.pop(i)
-                self._save_captions()
-                return True
-        return False
+        if self._remove_from_store(caption_id) is None:
+            return False
+        self._record_change("delete", caption_id)
+        self._save_captions()
+        return True
 
     def clear_all_captions(self):
         """Clear all captions from storage."""
-        self.captions = []
+        self._reset_store()
+        self._reset_changelog()
         self._save_captions()
 
     def get_statistics(self) -> Dict:
@@ -224,55 +712,92 @@ class CaptionManager:
             }
 
         # Count by category
-        categories = {}
-        for caption in self.captions:
-            cat = caption["category"]
-            categories[cat] = categories.get(cat, 0) + 1
-
-        # Get most used captions
-        most_used = sorted(
-            self.captions,
-            key=lambda x: x.get("usage_count", 0),
-            reverse=True
-        )[:5]
-
-        # Get recent captions
-        recent = sorted(
-            self.captions,
-            key=lambda x: x.get("created_at", ""),
-            reverse=True
-        )[:5]
+        categories = {cat: len(ids) for cat, ids in self.category_index.items()}
 
         return {
             "total": len(self.captions),
             "categories": categories,
-            "most_used": most_used,
-            "recent": recent
+            "most_used": self.get_popular_captions(5),
+            "recent": self.get_recent_captions(5)
         }
 
     def export_to_excel(self, filepath: str):
         """Export all captions to an Excel file."""
         if not self.captions:
             return False
-
-        # Prepare data for DataFrame
-        data = []
-        for caption in self.captions:
-            data.append({
-                "Category": caption["category"],
-                "Caption": caption["text"],
-                "Usage Count": caption.get("usage_count", 0),
-                "Created": caption.get("created_at", ""),
-                "Source": caption.get("source", "")
-            })
-
-        # Create DataFrame and save to Excel
-        df = pd.DataFrame(data)
-        df.to_excel(filepath, index=False, sheet_name="Captions")
+        with open(filepath, 'wb') as f:
+            self.write_export(list(self.captions.values()), "xlsx", f)
         return True
 
+    @staticmethod
+    def _export_row(caption: Dict) -> List:
+        return [
+            caption["category"],
+            caption["text"],
+            caption.get("usage_count", 0),
+            caption.get("created_at", ""),
+            caption.get("source", "")
+        ]
+
+    def write_export(self, captions: Iterable[Dict], export_format: str, stream: BinaryIO):
+        """
+        Write captions to a binary stream one row at a time.
+
+        Args:
+            captions: Captions to export (pass a snapshot such as
+                list(captions.values()) when running in a worker thread)
+            export_format: "xlsx", "csv" or "ndjson"
+            stream: Binary file-like object; it only needs write()
+
+        xlsx uses a write-only workbook, which spools rows to a temp file
+        rather than holding cells in memory. csv and ndjson are buffered in
+        small chunks.
+        """
+        if export_format not in EXPORT_FORMATS:
+            raise ValueError(f"format must be one of: {', '.join(EXPORT_FORMATS)}")
+
+        if export_format == "xlsx":
+            workbook = Workbook(write_only=True)
+            sheet = workbook.create_sheet("Captions")
+            sheet.append(EXPORT_COLUMNS)
+            for caption in captions:
+                sheet.append(self._export_row(caption))
+            workbook.save(stream)
+            return
+
+        buffer = io.StringIO()
+        writer = csv.writer(buffer)
+        if export_format == "csv":
+            writer.writerow(EXPORT_COLUMNS)
+
+        for caption in captions:
+            if export_format == "csv":
+                writer.writerow(self._export_row(caption))
+            else:
+                buffer.write(json.dumps(caption, ensure_ascii=False) + "\n")
+            if buffer.tell() >= EXPORT_BUFFER_BYTES:
+                stream.write(buffer.getvalue().encode("utf-8"))
+                buffer.seek(0)
+                buffer.truncate()
+        stream.write(buffer.getvalue().encode("utf-8"))
+
+    def find_duplicate(self, text: str) -> Optional[Dict]:
+        """Get a stored caption whose normalized text matches."""
+        caption_id = self.duplicate_index.find_exact(text)
+        return self.captions.get(caption_id) if caption_id else None
+
+    def get_duplicate_groups(self, threshold: float = NEAR_DUPLICATE_THRESHOLD) -> List[List[Dict]]:
+        """Get groups of exact and near-duplicate captions, largest first."""
+        groups = self.duplicate_index.groups(threshold)
+        groups.sort(key=len, reverse=True)
+        return [[self.captions[i] for i in group] for group in groups]
+
     def add_single_caption(self, text: str, category: str, created_by: str = "admin") -> Dict:
-        """Add a single caption manually."""
+        """Add a single caption manually (returns the existing one if it's a duplicate)."""
+        existing = self.find_duplicate(text)
+        if existing is not None:
+            return existing
+
         new_caption = {
             "id": f"cap_{datetime.now().strftime('%Y%m%d%H%M%S')}_{uuid.uuid4().hex[:6]}",
             "text": text,
@@ -282,40 +807,36 @@ class CaptionManager:
             "created_at": datetime.now().isoformat(),
             "source": "manual"
         }
-        self.captions.append(new_caption)
+        self._add_to_store(new_caption)
+        self._record_change("insert", new_caption["id"])
         self._save_captions()
         return new_caption
 
     def update_caption(self, caption_id: str, text: str = None, category: str = None) -> bool:
         """Update an existing caption."""
-        for caption in self.captions:
-            if caption["id"] == caption_id:
-                if text:
-                    caption["text"] = text
-                if category:
-                    caption["category"] = self._normalize_category(category)
-                caption["updated_at"] = datetime.now().isoformat()
-                self._save_captions()
-                return True
-        return False
+        caption = self.captions.get(caption_id)
+        if caption is None:
+            return False
+
+        self._unindex_caption(caption)
+        if text:
+            caption["text"] = text
+        if category:
+            caption["category"] = self._normalize_category(category)
+        caption["updated_at"] = datetime.now().isoformat()
+        self._index_caption(caption)
+        self._record_change("update", caption_id)
+
+        self._save_captions()
+        return True
 
     def get_popular_captions(self, limit: int = 10) -> List[Dict]:
         """Get the most popular captions based on usage."""
-        sorted_captions = sorted(
-            self.captions,
-            key=lambda x: x.get("usage_count", 0),
-            reverse=True
-        )
-        return sorted_captions[:limit]
+        return [self.captions[i] for i in self.usage_index.top(limit)]
 
     def get_recent_captions(self, limit: int = 10) -> List[Dict]:
         """Get recently added captions."""
-        sorted_captions = sorted(
-            self.captions,
-            key=lambda x: x.get("created_at", ""),
-            reverse=True
-        )
-        return sorted_captions[:limit]
+        return [self.captions[i] for i in self.recency_index.top(limit)]
 
 # Initialize global caption manager instance
 caption_manager = CaptionManager()
\ No newline at end of file
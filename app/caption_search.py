@@ -0,0 +1,154 @@
+"""
+Caption Search Index
+Token and character-trigram inverted index for fast caption search
+"""
+
+import heapq
+import re
+from collections import defaultdict
+from typing import Container, Dict, List, Optional, Set, Tuple
+
+# Words (letters/digits in any script) or single emoji/pictographs
+TOKEN_PATTERN = re.compile(
+    r"[\U0001F000-\U0001FAFF\u2600-\u27BF\u2B00-\u2BFF\u3030\u303D\u3297\u3299]"
+    r"|[^\W_]+"
+)
+
+
+def tokenize(text: str) -> List[str]:
+    """Split lowercased text into word and emoji tokens."""
+    return TOKEN_PATTERN.findall(text.lower())
+
+
+def trigrams(text: str) -> Set[str]:
+    """Distinct character trigrams of an already lowercased string."""
+    return {text[i:i + 3] for i in range(len(text) - 2)}
+
+
+def index_terms(text: str) -> Tuple[str, Set[str], Set[str]]:
+    """Lowercased text with its trigrams and tokens, as CaptionSearchIndex.add indexes them."""
+    lowered = (text or "").lower()
+    return lowered, trigrams(lowered), set(tokenize(lowered))
+
+
+class CaptionSearchIndex:
+    """
+    Inverted index over caption text.
+
+    Substring matches (the original search semantics) are found by
+    intersecting trigram postings and verifying the few candidates. Captions
+    that contain every query token, in any order, also match but rank below
+    substring matches. Posting lists are sets of caption ids, so adds and
+    removes are proportional to the caption's own length.
+    """
+
+    def __init__(self):
+        self.texts: Dict[str, str] = {}  # caption id -> lowercased text
+        self.trigram_index: Dict[str, Set[str]] = defaultdict(set)
+        self.token_index: Dict[str, Set[str]] = defaultdict(set)
+
+    def add(self, caption_id: str, text: str,
+            terms: Optional[Tuple[str, Set[str], Set[str]]] = None):
+        """
+        Index a caption (replacing any previous text for the id).
+
+        terms is index_terms(text) when it was already computed, e.g. in a
+        worker thread.
+        """
+        if caption_id in self.texts:
+            self.remove(caption_id)
+
+        lowered, grams, tokens = terms or index_terms(text)
+        self.texts[caption_id] = lowered
+        for gram in grams:
+            self.trigram_index[gram].add(caption_id)
+        for token in tokens:
+            self.token_index[token].add(caption_id)
+
+    def remove(self, caption_id: str):
+        """Drop a caption from the index."""
+        lowered = self.texts.pop(caption_id, None)
+        if lowered is None:
+            return
+
+        for gram in trigrams(lowered):
+            self._discard(self.trigram_index, gram, caption_id)
+        for token in set(tokenize(lowered)):
+            self._discard(self.token_index, token, caption_id)
+
+    @staticmethod
+    def _discard(index: Dict[str, Set[str]], key: str, caption_id: str):
+        ids = index.get(key)
+        if ids is not None:
+            ids.discard(caption_id)
+            if not ids:
+                del index[key]
+
+    @staticmethod
+    def _intersect(postings: List[Set[str]]) -> Set[str]:
+        """Intersect posting sets, smallest first."""
+        if not postings:
+            return set()
+        postings = sorted(postings, key=len)
+        result = set(postings[0])
+        for ids in postings[1:]:
+            result &= ids
+            if not result:
+                break
+        return result
+
+    def search(self, query: str, allowed: Optional[Container[str]] = None,
+               limit: Optional[int] = None) -> List[str]:
+        """
+        Find caption ids matching a query, best first.
+
+        Args:
+            query: Search text (case-insensitive)
+            allowed: Optional set of ids to restrict to (e.g. a category)
+            limit: Maximum ids to return
+
+        Returns:
+            Caption ids ranked by: substring match before token-only match,
+            then number of whole-token hits, then match position.
+        """
+        needle = query.lower().strip()
+        if not needle:
+            return []
+        query_tokens = set(tokenize(needle))
+
+        # Substring candidates
+        if len(needle) >= 3:
+            candidates = self._intersect([
+                self.trigram_index.get(gram, set()) for gram in trigrams(needle)
+            ])
+        elif len(needle) == 1 and query_tokens == {needle} and not needle.isalnum():
+            # A lone emoji is always its own token
+            candidates = self.token_index.get(needle, set())
+        else:
+            # One- or two-character text: verify against every caption
+            candidates = self.texts.keys()
+
+        # Token-only candidates (all query tokens present, any order)
+        token_matches = self._intersect([
+            self.token_index.get(token, set()) for token in query_tokens
+        ]) if query_tokens else set()
+
+        scored = []
+        seen = set()
+        for caption_id in candidates:
+            if allowed is not None and caption_id not in allowed:
+                continue
+            position = self.texts[caption_id].find(needle)
+            if position < 0:
+                continue
+            seen.add(caption_id)
+            hits = sum(1 for token in query_tokens if caption_id in self.token_index.get(token, ()))
+            scored.append((0, -hits, position, caption_id))
+
+        for caption_id in token_matches:
+            if caption_id in seen or (allowed is not None and caption_id not in allowed):
+                continue
+            scored.append((1, -len(query_tokens), 0, caption_id))
+
+        best = heapq.nsmallest(limit, scored) if limit else sorted(scored)
+        return [entry[3] for entry in best]
@@ -3,217 +3,607 @@ Content Library Manager for PROMURA Dashboard
 Handles media storage, retrieval, and usage tracking
 """
 
+import atexit
+import hashlib
+import heapq
 import json
+import multiprocessing
 import os
 import shutil
+import threading
+from concurrent.futures import Future, ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
 from datetime import datetime
 from pathlib import Path
+from itertools import islice
 from typing import List, Dict, Optional
-import hashlib
-from PIL import Image
 import uuid
+from app.media_processing import process_media
+from app.paging import decode_cursor, encode_cursor, is_int, valid_sort_position
+from app.sorted_index import SortedIndex
+from app.usage_log import UsageEventLog, write_json_atomic
+
+# Thumbnails and dimensions are computed off the request path in worker processes
+MEDIA_PROCESS_WORKERS = max(1, min(4, (os.cpu_count() or 2) - 1))
+MEDIA_PROCESS_ATTEMPTS = 3  # Tries per file when a worker dies and takes the pool down
+
+IMAGE_EXTENSIONS = ['.jpg', '.jpeg', '.png', '.gif', '.webp']
+VIDEO_EXTENSIONS = ['.mp4', '.mov', '.avi', '.webm']
+
+# Content-addressed storage: blobs/ab/cd/<sha256><ext> under the library root
+LIBRARY_URL = "/static/library"
+BLOB_SHARD_LEVELS = 2     # Two hex characters per directory level
+HASH_CHUNK_SIZE = 1024 * 1024
+
+# Paged reads (get_media_page); name is A-Z, the rest largest/newest first
+LIBRARY_SORTS = ("upload_date", "used_count", "size", "name")
+LIBRARY_ASCENDING_SORTS = ("name",)
+LIBRARY_DIRECT_RATIO = 8  # Sort a filter's own ids when it matches under 1/8 of the library
+LIBRARY_PAGE_MAX = 500
+LIBRARY_THIN_FIELDS = ("id", "thumbnail_url", "type", "dimensions")
+
+
+def _sort_key(entry: Dict, sort: str):
+    if sort == "upload_date":
+        return entry.get("upload_date") or ""
+    if sort == "used_count":
+        return entry.get("used_count", 0)
+    if sort == "name":
+        return entry.get("filename", "").lower()
+    return entry.get("file_size_bytes", 0)
+
+
+def _valid_sort_key(sort: str, key) -> bool:
+    """Whether a cursor key has the type sort uses."""
+    return isinstance(key, str) if sort in ("upload_date", "name") else is_int(key)
+
 
 class ContentLibrary:
     def __init__(self, base_path: str = "/opt/promura/app/static/library"):
         self.base_path = Path(base_path)
         self.metadata_file = self.base_path / "metadata.json"
         self.ensure_directories()
+        # Guards library mutations and saves; processing results arrive on
+        # executor threads
+        self.lock = threading.RLock()
+        self.media_executor: Optional[ProcessPoolExecutor] = None
+        # Usage bumps are appended here and folded into metadata.json later
+        self.usage_log = UsageEventLog(
+            self.metadata_file.with_suffix(".usage.jsonl"), compact=self.save_metadata
+        )
         self.load_metadata()
 
+        # Resume processing interrupted by a restart
+        for media_type in ['images', 'videos']:
+            for item in list(self.media[media_type].values()):
+                if item.get("status") == "processing":
+                    self._submit_processing(item, media_type)
+
     def ensure_directories(self):
         """Ensure all required directories exist"""
-        for media_type in ['images', 'videos']:
-            for subdir in ['original', 'thumbnails']:
-                (self.base_path / media_type / subdir).mkdir(parents=True, exist_ok=True)
+        for subdir in ['blobs', 'thumbnails']:
+            (self.base_path / subdir).mkdir(parents=True, exist_ok=True)
+        # Uploads are streamed here first so moving them into place is a rename
+        self.staging_dir = self.base_path / ".incoming"
+        self.staging_dir.mkdir(parents=True, exist_ok=True)
+
+    def staging_path(self, filename: str) -> Path:
+        """Fresh temp path for streaming an upload on the library's filesystem"""
+        return self.staging_dir / f"{uuid.uuid4().hex}{Path(filename).suffix.lower()}"
+
+    @staticmethod
+    def get_media_type(filename: str) -> str:
+        """Library folder ("images" or "videos") for a filename"""
+        ext = Path(filename).suffix.lower()
+        if ext in IMAGE_EXTENSIONS:
+            return "images"
+        if ext in VIDEO_EXTENSIONS:
+            return "videos"
+        raise ValueError(f"Unsupported file type: {ext}")
+
+    @staticmethod
+    def _sharded(root: str, digest: str, suffix: str) -> str:
+        shards = [digest[i * 2:i * 2 + 2] for i in range(BLOB_SHARD_LEVELS)]
+        return "/".join([root, *shards, digest + suffix])
+
+    def blob_relpath(self, sha256: str, ext: str) -> str:
+        """Library-relative path of the blob holding content sha256"""
+        return self._sharded("blobs", sha256, ext.lower())
+
+    def thumbnail_relpath(self, sha256: str) -> str:
+        """Library-relative path of the thumbnail for content sha256"""
+        return self._sharded("thumbnails", sha256, ".jpg")
+
+    @staticmethod
+    def url_for(relpath: str) -> str:
+        return f"{LIBRARY_URL}/{relpath}"
+
+    def path_for_url(self, url: str) -> Path:
+        """Filesystem path behind a library URL"""
+        return self.base_path / url[len(LIBRARY_URL):].lstrip("/")
+
+    def get_media_path(self, entry: Dict) -> Path:
+        """Filesystem path of an entry's original file"""
+        if entry.get("storage_path"):
+            return self.base_path / entry["storage_path"]
+        # Entries not yet migrated to the blob store
+        media_type = "images" if entry["type"] == "image" else "videos"
+        return self.base_path / media_type / "original" / entry["filename"]
+
+    @staticmethod
+    def hash_file(path: Path) -> str:
+        """Hex SHA-256 of a file, read in chunks"""
+        hasher = hashlib.sha256()
+        with open(path, 'rb') as f:
+            while chunk := f.read(HASH_CHUNK_SIZE):
+                hasher.update(chunk)
+        return hasher.hexdigest()
 
     def load_metadata(self):
         """Load or initialize library metadata"""
         if self.metadata_file.exists():
             with open(self.metadata_file, 'r') as f:
-                self.library = json.load(f)
+                library = json.load(f)
         else:
-            self.library = {
+            library = {
                 "images": [],
                 "videos": [],
                 "tags": [],
                 "total_items": 0
             }
-            self.save_metadata()
-
-    def save_metadata(self):
-        """Save library metadata to file"""
-        with open(self.metadata_file, 'w') as f:
-            json.dump(self.library, f, indent=2, default=str)
 
-    def generate_file_id(self, filename: str, content: bytes) -> str:
-        """Generate unique ID for file based on content hash"""
-        hash_md5 = hashlib.md5(content).hexdigest()[:8]
-        return f"{Path(filename).stem}_{hash_md5}"
-
-    def create_thumbnail(self, file_path: Path, media_type: str) -> Path:
-        """Create thumbnail for media file"""
-        thumb_dir = self.base_path / media_type / "thumbnails"
-        thumb_path = thumb_dir / f"{file_path.stem}_thumb.jpg"
-
-        if media_type == "images":
-            try:
-                img = Image.open(file_path)
-                img.thumbnail((300, 300), Image.Resampling.LANCZOS)
-                img.save(thumb_path, "JPEG", quality=85)
-                return thumb_path
-            except Exception as e:
-                print(f"Error creating thumbnail: {e}")
-                return file_path
-        else:
-            # For videos, we'll use a placeholder or extract frame later
-            return file_path
+        self._build_indexes(library)
+        if not self.metadata_file.exists():
+            self.save_metadata()
+        self._migrate_to_blob_store()
 
-    def add_media(self, file_data: bytes, filename: str, tags: List[str] = None,
-                  description: str = "") -> Dict:
-        """Add new media to library"""
-        # Determine media type
-        ext = Path(filename).suffix.lower()
-        if ext in ['.jpg', '.jpeg', '.png', '.gif', '.webp']:
-            media_type = "images"
-        elif ext in ['.mp4', '.mov', '.avi', '.webm']:
-            media_type = "videos"
+        replayed = False
+        for event in self.usage_log.replay():
+            replayed = self._apply_usage(event["id"], event.get("ts")) or replayed
+        if replayed:
+            self.save_metadata()
         else:
-            raise ValueError(f"Unsupported file type: {ext}")
+            self.usage_log.reset()
 
-        # Generate unique ID
-        media_id = self.generate_file_id(filename, file_data)
-
-        # Check if already exists
-        existing = self.get_media_by_id(media_id)
-        if existing:
-            existing["used_count"] += 1
+    def save_metadata(self):
+        """Save library metadata to file (this also compacts the usage log)"""
+        with self.lock:
+            library = {
+                "images": list(self.media["images"].values()),
+                "videos": list(self.media["videos"].values()),
+                "tags": list(self.tags),
+                "total_items": len(self.id_index)
+            }
+            write_json_atomic(self.metadata_file, library, indent=2, default=str)
+            self.usage_log.reset()
+
+    def _build_indexes(self, library: Dict):
+        """
+        Build the in-memory store from metadata.json's lists.
+
+        media holds each type's entries as an insertion-ordered id -> entry
+        dict; id_index, hash_index and tag_index are kept in sync by
+        _index_entry/_unindex_entry on every mutation.
+        """
+        self.media: Dict[str, Dict[str, Dict]] = {"images": {}, "videos": {}}
+        self.id_index: Dict[str, Dict] = {}
+        self.hash_index: Dict[str, List[Dict]] = {}
+        self.tag_index: Dict[str, Dict[str, None]] = {}
+        self.tags: Dict[str, None] = dict.fromkeys(library.get("tags", []))
+        self.order: Dict[str, int] = {}
+        self.next_seq = 0
+        self.sort_indexes: Dict[str, SortedIndex] = {sort: SortedIndex() for sort in LIBRARY_SORTS}
+        for media_type in ['images', 'videos']:
+            for item in library.get(media_type, []):
+                self._index_entry(item, media_type)
+
+    def _index_entry(self, entry: Dict, media_type: str):
+        media_id = entry["id"]
+        self.media[media_type][media_id] = entry
+        self.id_index[media_id] = entry
+        self.order[media_id] = self.next_seq
+        self.next_seq += 1
+        for sort, index in self.sort_indexes.items():
+            index.add(_sort_key(entry, sort), media_id)
+        if entry.get("sha256"):
+            self.hash_index.setdefault(entry["sha256"], []).append(entry)
+        self._index_tags(media_id, entry.get("tags", []))
+
+    def _unindex_entry(self, entry: Dict, media_type: str):
+        media_id = entry["id"]
+        self.media[media_type].pop(media_id, None)
+        self.id_index.pop(media_id, None)
+        self.order.pop(media_id, None)
+        for sort, index in self.sort_indexes.items():
+            index.remove(_sort_key(entry, sort), media_id)
+        if entry.get("sha256"):
+            sharing = [e for e in self.hash_index.get(entry["sha256"], []) if e is not entry]
+            if sharing:
+                self.hash_index[entry["sha256"]] = sharing
+            else:
+                self.hash_index.pop(entry["sha256"], None)
+        self._unindex_tags(media_id, entry.get("tags", []))
+
+    def _index_tags(self, media_id: str, tags: List[str]):
+        for tag in tags:
+            self.tag_index.setdefault(tag, {})[media_id] = None
+            self.tags.setdefault(tag, None)
+
+    def _unindex_tags(self, media_id: str, tags: List[str]):
+        for tag in tags:
+            ids = self.tag_index.get(tag)
+            if ids is not None:
+                ids.pop(media_id, None)
+                if not ids:
+                    del self.tag_index[tag]
+
+    def _migrate_to_blob_store(self):
+        """
+        Move files from the old {type}/original/<name> layout into the blob store.
+
+        Blobs are linked (or copied) first and the old files are only removed
+        once metadata.json points at the blobs, so an interrupted migration
+        never leaves an entry without its file. Ids and thumbnails are kept.
+        """
+        moved = []
+        for media_type in ['images', 'videos']:
+            for item in self.media[media_type].values():
+                if item.get("sha256"):
+                    continue
+                legacy_path = self.base_path / media_type / "original" / item["filename"]
+                if not legacy_path.exists():
+                    continue
+
+                sha256 = self.hash_file(legacy_path)
+                sharers = self.hash_index.get(sha256)
+                # Duplicates share the first copy's blob, whatever their extension
+                storage_path = (sharers[0]["storage_path"] if sharers
+                                else self.blob_relpath(sha256, legacy_path.suffix))
+                blob_path = self.base_path / storage_path
+                if not blob_path.exists():
+                    blob_path.parent.mkdir(parents=True, exist_ok=True)
+                    try:
+                        os.link(legacy_path, blob_path)
+                    except OSError:
+                        shutil.copy2(legacy_path, blob_path)
+
+                if item.get("thumbnail_url") == item.get("url"):
+                    item["thumbnail_url"] = self.url_for(storage_path)
+                item["url"] = self.url_for(storage_path)
+                item["sha256"] = sha256
+                item["storage_path"] = storage_path
+                self.hash_index.setdefault(sha256, []).append(item)
+                moved.append(legacy_path)
+
+        if moved:
+            self.save_metadata()
+            for legacy_path in moved:
+                legacy_path.unlink(missing_ok=True)
+            print(f"Content library: migrated {len(moved)} files to the blob store")
+
+    def _get_executor(self) -> ProcessPoolExecutor:
+        """Start the media worker pool on first use"""
+        if self.media_executor is None:
+            # spawn: forking a threaded server process is unsafe. Workers re-import
+            # the entry module, so launch with `uvicorn app.main:app`, not app/main.py
+            self.media_executor = ProcessPoolExecutor(
+                max_workers=MEDIA_PROCESS_WORKERS,
+                mp_context=multiprocessing.get_context("spawn")
+            )
+            atexit.register(self.media_executor.shutdown, wait=False, cancel_futures=True)
+        return self.media_executor
+
+    def _discard_executor(self, executor: ProcessPoolExecutor):
+        """Drop a broken worker pool so the next submit starts a fresh one"""
+        with self.lock:
+            if self.media_executor is executor:
+                self.media_executor = None
+        # No wait: this may run on the broken pool's own callback thread
+        executor.shutdown(wait=False, cancel_futures=True)
+
+    def _submit_processing(self, entry: Dict, media_type: str, attempt: int = 1):
+        """Queue thumbnail/dimension work for an entry in the processing state"""
+        file_path = self.get_media_path(entry)
+        thumb_relpath = self.thumbnail_relpath(entry.get("sha256") or entry["id"])
+        thumb_path = self.base_path / thumb_relpath
+        thumb_path.parent.mkdir(parents=True, exist_ok=True)
+        args = (process_media, str(file_path), str(thumb_path), media_type)
+        with self.lock:
+            executor = self._get_executor()
+            try:
+                future = executor.submit(*args)
+            except BrokenProcessPool:
+                # Broke before its pending futures' callbacks replaced it
+                self._discard_executor(executor)
+                executor = self._get_executor()
+                future = executor.submit(*args)
+        future.add_done_callback(
+            lambda done: self._finish_processing(
+                entry["id"], thumb_relpath, done, media_type, executor, attempt
+            )
+        )
+
+    def _finish_processing(self, media_id: str, thumb_relpath: str, future: Future,
+                           media_type: str, executor: ProcessPoolExecutor, attempt: int):
+        """Merge worker results into the entry and save (runs on an executor thread)"""
+        try:
+            result = future.result()
+            error = None
+        except BrokenProcessPool as e:
+            # A dead worker (e.g. OOM-killed) fails every job in its pool, not
+            # just its own; requeue on a fresh pool unless this file keeps failing
+            if attempt < MEDIA_PROCESS_ATTEMPTS:
+                self._discard_executor(executor)
+                with self.lock:
+                    entry = self.get_media_by_id(media_id)
+                    if entry is not None:
+                        self._submit_processing(entry, media_type, attempt + 1)
+                return
+            result, error = {}, str(e)
+        except Exception as e:
+            result, error = {}, str(e)
+
+        with self.lock:
+            entry = self.get_media_by_id(media_id)
+            if entry is None:
+                # Deleted while processing; drop the orphaned thumbnail
+                if result.get("thumbnail"):
+                    (self.base_path / thumb_relpath).unlink(missing_ok=True)
+                return
+
+            # Entries are created with every key below, so readers iterating
+            # them on other threads never see the dict change size
+            if result.get("thumbnail"):
+                entry["thumbnail_url"] = self.url_for(thumb_relpath)
+            for key in ("dimensions", "width", "height", "format"):
+                if key in result:
+                    entry[key] = result[key]
+            entry["processing_error"] = error
+            entry["status"] = "failed" if error else "ready"
             self.save_metadata()
-            return existing
-
-        # Save original file
-        original_dir = self.base_path / media_type / "original"
-        file_path = original_dir / filename
-
-        # Ensure unique filename
-        counter = 1
-        while file_path.exists():
-            file_path = original_dir / f"{Path(filename).stem}_{counter}{Path(filename).suffix}"
-            counter += 1
-
-        # Write file
-        with open(file_path, 'wb') as f:
-            f.write(file_data)
 
-        # Create thumbnail
-        thumb_path = self.create_thumbnail(file_path, media_type)
+    def add_media(self, source_path: Path, filename: str, content_sha256: str,
+                  tags: List[str] = None, description: str = "") -> Dict:
+        """
+        Add an already written file to the library.
+
+        source_path is moved (renamed) into the blob store, so it should come
+        from staging_path(); content_sha256 is its hex SHA-256, computed while
+        the upload was streamed. Content already in the library returns the
+        existing entry whatever name it was uploaded under.
+        """
+        source_path = Path(source_path)
+        media_type = self.get_media_type(filename)
+
+        with self.lock:
+            # Check if already exists
+            existing = self.hash_index.get(content_sha256)
+            if existing:
+                source_path.unlink(missing_ok=True)
+                # A re-upload bumps the count but isn't a use, so last_used stays
+                old_key = _sort_key(existing[0], "used_count")
+                existing[0]["used_count"] = old_key + 1
+                self.sort_indexes["used_count"].update(old_key, existing[0]["used_count"], existing[0]["id"])
+                self.save_metadata()
+                return existing[0]
+
+            # Move the upload into its blob
+            storage_path = self.blob_relpath(content_sha256, Path(filename).suffix)
+            blob_path = self.base_path / storage_path
+            blob_path.parent.mkdir(parents=True, exist_ok=True)
+            os.replace(source_path, blob_path)
 
         # Get file info
-        file_size = len(file_data)
+        file_size = blob_path.stat().st_size
 
-        # Create metadata entry
+        # Create metadata entry; the thumbnail is the original until processing finishes
+        url = self.url_for(storage_path)
         media_entry = {
-            "id": media_id,
-            "filename": file_path.name,
+            "id": content_sha256,
+            "filename": filename,
             "original_name": filename,
+            "sha256": content_sha256,
+            "storage_path": storage_path,
             "type": media_type.rstrip('s'),  # "image" or "video"
-            "url": f"/static/library/{media_type}/original/{file_path.name}",
-            "thumbnail_url": f"/static/library/{media_type}/thumbnails/{thumb_path.name}",
+            "url": url,
+            "thumbnail_url": url,
             "upload_date": datetime.now().isoformat(),
             "file_size": self.format_size(file_size),
             "file_size_bytes": file_size,
             "used_count": 1,
             "last_used": datetime.now().isoformat(),
             "tags": tags or [],
-            "description": description
+            "description": description,
+            "status": "processing",
+            "processing_error": None,
+            "dimensions": None,
+            "width": None,
+            "height": None,
+            "format": None
         }
 
-        # Add dimensions for images
-        if media_type == "images":
-            try:
-                img = Image.open(file_path)
-                media_entry["dimensions"] = f"{img.width}x{img.height}"
-                media_entry["width"] = img.width
-                media_entry["height"] = img.height
-            except:
-                pass
-
-        # Add to library
-        self.library[media_type].append(media_entry)
-        self.library["total_items"] += 1
-
-        # Update tags list
-        if tags:
-            for tag in tags:
-                if tag not in self.library["tags"]:
-                    self.library["tags"].append(tag)
+        with self.lock:
+            # Add to library
+            self._index_entry(media_entry, media_type)
+            self.save_metadata()
 
-        self.save_metadata()
+        self._submit_processing(media_entry, media_type)
         return media_entry
 
     def get_media_by_id(self, media_id: str) -> Optional[Dict]:
         """Get media entry by ID"""
-        for media_type in ['images', 'videos']:
-            for item in self.library[media_type]:
-                if item["id"] == media_id:
-                    return item
-        return None
+        return self.id_index.get(media_id)
 
     def use_media(self, media_id: str) -> bool:
         """Increment usage count for media"""
-        media = self.get_media_by_id(media_id)
-        if media:
-            media["used_count"] += 1
-            media["last_used"] = datetime.now().isoformat()
-            self.save_metadata()
+        timestamp = datetime.now().isoformat()
+        # One critical section, so a save_metadata in between can't both fold
+        # the bump into metadata.json and leave it in the fresh log
+        with self.lock:
+            if self._apply_usage(media_id, timestamp):
+                self.usage_log.record(media_id, "use", timestamp)
+                return True
+            return False
+
+    def _apply_usage(self, media_id: str, timestamp: str) -> bool:
+        """Fold one usage event into the in-memory counters"""
+        with self.lock:
+            media = self.get_media_by_id(media_id)
+            if media is None:
+                return False
+            old_key = _sort_key(media, "used_count")
+            media["used_count"] = media.get("used_count", 0) + 1
+            self.sort_indexes["used_count"].update(old_key, media["used_count"], media_id)
+            media["last_used"] = timestamp or datetime.now().isoformat()
             return True
-        return False
 
     def delete_media(self, media_id: str) -> bool:
         """Delete media from library"""
-        for media_type in ['images', 'videos']:
-            for i, item in enumerate(self.library[media_type]):
-                if item["id"] == media_id:
-                    # Delete files
-                    try:
-                        original_path = self.base_path / media_type / "original" / item["filename"]
-                        if original_path.exists():
-                            original_path.unlink()
-
-                        # Delete thumbnail
-                        thumb_name = Path(item["thumbnail_url"]).name
-                        thumb_path = self.base_path / media_type / "thumbnails" / thumb_name
-                        if thumb_path.exists():
-                            thumb_path.unlink()
-                    except:
-                        pass
-
-                    # Remove from metadata
-                    del self.library[media_type][i]
-                    self.library["total_items"] -= 1
-                    self.save_metadata()
-                    return True
-        return False
-
-    def get_all_media(self, media_type: str = None, tags: List[str] = None) -> List[Dict]:
-        """Get all media, optionally filtered"""
-        result = []
+        with self.lock:
+            item = self.id_index.get(media_id)
+            if item is None:
+                return False
+
+            # Remove from metadata
+            media_type = "images" if item["type"] == "image" else "videos"
+            self._unindex_entry(item, media_type)
+
+            # Delete files, unless still used by an entry migrated from the old
+            # layout that shares this content
+            sharers = self.hash_index.get(item["sha256"], []) if item.get("sha256") else []
+            try:
+                if not any(s.get("storage_path") == item.get("storage_path") for s in sharers):
+                    self.get_media_path(item).unlink(missing_ok=True)
+                thumbnail_url = item.get("thumbnail_url")
+                if (thumbnail_url and thumbnail_url != item["url"]
+                        and not any(s.get("thumbnail_url") == thumbnail_url for s in sharers)):
+                    self.path_for_url(thumbnail_url).unlink(missing_ok=True)
+            except OSError:
+                pass
 
+            self.save_metadata()
+            return True
+
+    def set_tags(self, media_id: str, tags: List[str], replace: bool = False) -> bool:
+        """Add tags to an item, or replace its tags"""
+        with self.lock:
+            item = self.id_index.get(media_id)
+            if item is None:
+                return False
+            old_tags = item.get("tags", [])
+            new_tags = list(dict.fromkeys(tags if replace else old_tags + tags))
+            self._unindex_tags(media_id, old_tags)
+            item["tags"] = new_tags
+            self._index_tags(media_id, new_tags)
+            return True
+
+    def get_all_media(self, media_type: str = None, tags: List[str] = None,
+                      match_all: bool = False) -> List[Dict]:
+        """
+        Get all media, optionally filtered.
+
+        Items match if they have any of tags, or all of them with match_all;
+        either way only the tag index is consulted, not every item.
+        """
         if media_type:
             types = [media_type + 's']  # Convert to plural
         else:
             types = ['images', 'videos']
-
-        for mtype in types:
-            if mtype in self.library:
-                for item in self.library[mtype]:
-                    if tags:
-                        # Filter by tags if provided
-                        if any(tag in item.get("tags", []) for tag in tags):
-                            result.append(item)
-                    else:
-                        result.append(item)
-
-        return result
+        types = [mtype for mtype in types if mtype in self.media]
+
+        with self.lock:
+            if not tags:
+                return [item for mtype in types for item in self.media[mtype].values()]
+
+            # Library order: by type, then insertion
+            matched = [self.id_index[media_id] for media_id in self._tagged_ids(tags, match_all)]
+            type_rank = {mtype.rstrip('s'): rank for rank, mtype in enumerate(types)}
+            matched = [item for item in matched if item["type"] in type_rank]
+            matched.sort(key=lambda item: (type_rank[item["type"]], self.order[item["id"]]))
+            return matched
+
+    def _tagged_ids(self, tags: List[str], match_all: bool = False) -> set:
+        """Ids having any (or with match_all, every) one of tags"""
+        id_sets = [self.tag_index.get(tag, {}).keys() for tag in tags]
+        if match_all:
+            id_sets.sort(key=len)
+            return set(id_sets[0]).intersection(*id_sets[1:])
+        return set().union(*id_sets)
+
+    def get_media_page(self, media_type: str = None, tags: List[str] = None, match_all: bool = False,
+                       sort: str = "upload_date", cursor: str = None, limit: int = 60,
+                       fields: List[str] = None) -> Dict:
+        """
+        Get one page of media.
+
+        Args:
+            media_type: Optional "image" or "video"
+            tags: Optional tag filter (any of them, or all with match_all)
+            sort: "upload_date", "used_count" or "size" (largest/newest
+                first), or "name" (A-Z)
+            cursor: Opaque cursor from a previous page
+            limit: Page size (capped at LIBRARY_PAGE_MAX)
+            fields: Fields to return (id is always included); defaults to
+                LIBRARY_THIN_FIELDS, ["all"] returns whole entries
+
+        Returns:
+            {"media": [...], "next_cursor": str or None, "total": int}
+
+        Raises:
+            ValueError: On an unknown sort or type, or a malformed cursor
+        """
+        if sort not in LIBRARY_SORTS:
+            raise ValueError(f"sort must be one of: {', '.join(LIBRARY_SORTS)}")
+        if media_type and media_type + 's' not in self.media:
+            raise ValueError("media_type must be image or video")
+        limit = max(1, min(limit or 60, LIBRARY_PAGE_MAX))
+        position = decode_cursor(cursor) if cursor else None
+        if position is not None and not valid_sort_position(sort, position, _valid_sort_key):
+            raise ValueError("Invalid cursor")
+        after = (position[1], position[2]) if position else None
+
+        with self.lock:
+            of_type = self.media[media_type + 's'] if media_type else None
+            tagged = self._tagged_ids(tags, match_all) if tags else None
+            if tagged is not None and of_type is not None:
+                tagged = {media_id for media_id in tagged if media_id in of_type}
+            allowed = tagged if tagged is not None else of_type
+
+            if allowed is not None and len(allowed) * LIBRARY_DIRECT_RATIO < len(self.id_index):
+                # Small match set: pick the page from its own ids instead of
+                # filtering a walk over the whole index
+                page = self._filtered_page(allowed, sort, after, limit + 1)
+            else:
+                index = self.sort_indexes[sort]
+                entries = index.iter_asc(after) if sort in LIBRARY_ASCENDING_SORTS else index.iter_desc(after)
+                if allowed is not None:
+                    entries = (entry for entry in entries if entry[1] in allowed) if allowed else iter(())
+                page = list(islice(entries, limit + 1))
+            next_cursor = None
+            if len(page) > limit:
+                key, media_id = page[limit - 1]
+                next_cursor = encode_cursor([sort, key, media_id])
+
+            items = [self.id_index[media_id] for _, media_id in page[:limit]]
+            if fields != ["all"]:
+                wanted = set(fields or LIBRARY_THIN_FIELDS) | {"id"}
+                items = [{k: v for k, v in item.items() if k in wanted} for item in items]
+            else:
+                items = [dict(item) for item in items]
+            total = len(allowed) if allowed is not None else len(self.id_index)
+
+        return {"media": items, "next_cursor": next_cursor, "total": total}
+
+    def _filtered_page(self, ids, sort: str, after, count: int) -> List[tuple]:
+        """Next count (key, id) entries among ids, in the order get_media_page uses."""
+        entries = ((_sort_key(self.id_index[i], sort), i) for i in ids)
+        if sort in LIBRARY_ASCENDING_SORTS:
+            if after is not None:
+                entries = (entry for entry in entries if entry > after)
+            return heapq.nsmallest(count, entries)
+        if after is not None:
+            entries = (entry for entry in entries if entry < after)
+        return heapq.nlargest(count, entries)
 
     def search_media(self, query: str) -> List[Dict]:
         """Search media by filename, tags, or description"""
@@ -221,7 +611,7 @@ class ContentLibrary:
         result = []
 
         for media_type in ['images', 'videos']:
-            for item in self.library[media_type]:
+            for item in self.media[media_type].values():
                 if (query in item["filename"].lower() or
                     query in item.get("description", "").lower() or
                     any(query in tag.lower() for tag in item.get("tags", []))):
@@ -236,18 +626,18 @@ class ContentLibrary:
         max_usage = 0
 
         for media_type in ['images', 'videos']:
-            for item in self.library[media_type]:
+            for item in self.media[media_type].values():
                 total_size += item.get("file_size_bytes", 0)
                 if item["used_count"] > max_usage:
                     max_usage = item["used_count"]
                     most_used = item
 
         return {
-            "total_items": self.library["total_items"],
-            "total_images": len(self.library["images"]),
-            "total_videos": len(self.library["videos"]),
+            "total_items": len(self.id_index),
+            "total_images": len(self.media["images"]),
+            "total_videos": len(self.media["videos"]),
             "total_size": self.format_size(total_size),
-            "unique_tags": len(self.library["tags"]),
+            "unique_tags": len(self.tags),
             "most_used": most_used
         }
 
@@ -3,15 +3,373 @@ Enhanced Logging System for PROMURA Dashboard
 Tracks API calls, success rates, errors, and performance metrics
 """
 
+import atexit
+import gzip
 import json
 import logging
+import logging.handlers
+import math
+import os
+import queue
+import resource
+import shutil
 import time
 from datetime import datetime, timedelta
 from pathlib import Path
-from typing import Dict, Any, List, Optional
+from typing import Callable, Dict, Any, List, Optional, Union
 from collections import defaultdict, deque
 import threading
 
+# Buffered log writer settings
+LOG_MAX_BYTES = 10 * 1024 * 1024  # Rotate a log file once it passes 10 MB
+LOG_BACKUP_COUNT = 5  # Rotated files kept per log
+LOG_COMPRESS_ROTATED = True  # Gzip rotated files
+LOG_FLUSH_BATCH_SIZE = 200  # Flush once this many lines are queued...
+LOG_FLUSH_INTERVAL = 0.5  # ...or after this many seconds
+
+
+class BufferedLogWriter:
+    """
+    Background writer for JSON-lines log files.
+
+    Callers only enqueue lines. A writer thread batches them, keeps one open
+    handle per file, rotates files past max_bytes (optionally gzipping the
+    rotated copy) and also runs queued callables such as metrics saves.
+    """
+
+    def __init__(self, max_bytes: int = LOG_MAX_BYTES, backup_count: int = LOG_BACKUP_COUNT,
+                 compress: bool = LOG_COMPRESS_ROTATED):
+        self.max_bytes = max_bytes
+        self.backup_count = backup_count
+        self.compress = compress
+        self.handles: Dict[Path, Any] = {}
+        self.queue: "queue.Queue[Union[tuple, Callable, None]]" = queue.Queue()
+        self.thread = threading.Thread(
+            target=self._run, name="promura-log-writer", daemon=True
+        )
+        self.thread.start()
+        atexit.register(self.close)
+
+    def write(self, path: Path, line: str):
+        """Queue one line (without trailing newline) for a file"""
+        self.queue.put((path, line))
+
+    def call(self, func: Callable):
+        """Run func on the writer thread"""
+        self.queue.put(func)
+
+    def flush(self):
+        """Block until everything queued so far has been written"""
+        self.queue.put(None)
+        self.queue.join()
+
+    def close(self):
+        """Flush and close all open files (they reopen on the next write)"""
+        self.flush()
+        self.call(self._close_handles)
+        self.queue.join()
+
+    def _run(self):
+        while True:
+            items = [self.queue.get()]
+            deadline = time.monotonic() + LOG_FLUSH_INTERVAL
+
+            # A None item is a flush request: write what we have right away
+            while items[-1] is not None and len(items) < LOG_FLUSH_BATCH_SIZE:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    items.append(self.queue.get(timeout=remaining))
+                except queue.Empty:
+                    break
+
+            try:
+                self._process(items)
+            except Exception as e:
+                print(f"Log writer error: {e}")
+
+            for _ in items:
+                self.queue.task_done()
+
+    def _process(self, items: List):
+        lines: Dict[Path, List[str]] = defaultdict(list)
+        callbacks = []
+        for item in items:
+            if isinstance(item, tuple):
+                lines[item[0]].append(item[1])
+            elif item is not None:
+                callbacks.append(item)
+
+        for path, batch in lines.items():
+            handle = self.handles.get(path)
+            if handle is None:
+                handle = self.handles[path] = open(path, 'a')
+            handle.write("\n".join(batch) + "\n")
+            handle.flush()
+            if handle.tell() >= self.max_bytes:
+                self._rotate(path)
+
+        for callback in callbacks:
+            try:
+                callback()
+            except Exception as e:
+                print(f"Log writer callback error: {e}")
+
+    def _rotate(self, path: Path):
+        """Shift path.N[.gz] -> path.N+1[.gz] and move path to path.1[.gz]"""
+        self.handles.pop(path).close()
+        suffix = ".gz" if self.compress else ""
+
+        oldest = path.with_name(f"{path.name}.{self.backup_count}{suffix}")
+        if oldest.exists():
+            oldest.unlink()
+        for i in range(self.backup_count - 1, 0, -1):
+            rotated = path.with_name(f"{path.name}.{i}{suffix}")
+            if rotated.exists():
+                rotated.rename(path.with_name(f"{path.name}.{i + 1}{suffix}"))
+
+        if self.backup_count == 0:
+            path.unlink()
+            return
+
+        first = path.with_name(f"{path.name}.1")
+        path.rename(first)
+        if self.compress:
+            with open(first, 'rb') as src, gzip.open(f"{first}.gz", 'wb') as dst:
+                shutil.copyfileobj(src, dst)
+            first.unlink()
+
+    def _close_handles(self):
+        for handle in self.handles.values():
+            handle.close()
+        self.handles.clear()
+
+
+class LatencyHistogram:
+    """
+    Fixed-size log-bucketed latency histogram (HDR-style).
+
+    Bucket i covers [MIN_VALUE * GROWTH**(i-1), MIN_VALUE * GROWTH**i), so
+    every recorded value is reported within ~4.5% no matter how many calls
+    are recorded. Memory is constant: BUCKETS counters per histogram.
+    """
+
+    MIN_VALUE = 1e-5  # 10 microseconds; bucket 0 holds anything faster
+    GROWTH = 2 ** (1 / 8)  # 8 buckets per doubling
+    BUCKETS = 216  # Top bucket starts around 20 minutes
+
+    def __init__(self):
+        self.counts = [0] * self.BUCKETS
+        self.count = 0
+        self.total = 0.0
+        self.min = None
+        self.max = None
+
+    @classmethod
+    def _bucket_index(cls, value: float) -> int:
+        if value < cls.MIN_VALUE:
+            return 0
+        index = int(math.log(value / cls.MIN_VALUE) / math.log(cls.GROWTH)) + 1
+        return min(index, cls.BUCKETS - 1)
+
+    @classmethod
+    def _bucket_value(cls, index: int) -> float:
+        """Representative (geometric midpoint) value of a bucket"""
+        if index == 0:
+            return cls.MIN_VALUE
+        return cls.MIN_VALUE * cls.GROWTH ** (index - 0.5)
+
+    def record(self, value: float):
+        """Record one latency in seconds"""
+        self.counts[self._bucket_index(value)] += 1
+        self.count += 1
+        self.total += value
+        self.min = value if self.min is None else min(self.min, value)
+        self.max = value if self.max is None else max(self.max, value)
+
+    def merge(self, other: "LatencyHistogram"):
+        """Add another histogram's counts into this one"""
+        for i, n in enumerate(other.counts):
+            if n:
+                self.counts[i] += n
+        self.count += other.count
+        self.total += other.total
+        if other.min is not None:
+            self.min = other.min if self.min is None else min(self.min, other.min)
+        if other.max is not None:
+            self.max = other.max if self.max is None else max(self.max, other.max)
+
+    def percentile(self, q: float) -> float:
+        """Approximate latency at quantile q (0-100)"""
+        if self.count == 0:
+            return 0.0
+        rank = max(1, math.ceil(self.count * q / 100))
+        seen = 0
+        for i, n in enumerate(self.counts):
+            seen += n
+            if seen >= rank:
+                return min(max(self._bucket_value(i), self.min), self.max)
+        return self.max
+
+    def summary(self) -> Dict[str, float]:
+        """Count, mean and p50/p90/p99/max for display"""
+        return {
+            "count": self.count,
+            "mean": self.total / self.count if self.count else 0.0,
+            "p50": self.percentile(50),
+            "p90": self.percentile(90),
+            "p99": self.percentile(99),
+            "max": self.max or 0.0
+        }
+
+    def cumulative_counts(self, bounds: List[float]) -> List[int]:
+        """Counts of values <= each bound, for Prometheus-style buckets"""
+        result = []
+        seen = 0
+        index = 0
+        for bound in bounds:
+            # A bucket counts toward a bound once its upper edge is within it
+            while (index < self.BUCKETS and
+                   self.MIN_VALUE * self.GROWTH ** index <= bound):
+                seen += self.counts[index]
+                index += 1
+            result.append(seen)
+        return result
+
+    def copy(self) -> "LatencyHistogram":
+        """Independent copy, so a snapshot can be read without the lock"""
+        histogram = LatencyHistogram()
+        histogram.counts = list(self.counts)
+        histogram.count = self.count
+        histogram.total = self.total
+        histogram.min = self.min
+        histogram.max = self.max
+        return histogram
+
+    def to_dict(self) -> Dict[str, Any]:
+        """Serialize with sparse buckets"""
+        return {
+            "count": self.count,
+            "sum": self.total,
+            "min": self.min,
+            "max": self.max,
+            "buckets": {str(i): n for i, n in enumerate(self.counts) if n}
+        }
+
+    @classmethod
+    def from_dict(cls, data: Any) -> "LatencyHistogram":
+        """Load a saved histogram, or migrate an old list of {"time", ...} samples"""
+        histogram = cls()
+        if isinstance(data, list):
+            for sample in data:
+                if isinstance(sample, dict) and "time" in sample:
+                    histogram.record(float(sample["time"]))
+            return histogram
+
+        for index, n in data.get("buckets", {}).items():
+            histogram.counts[min(int(index), cls.BUCKETS - 1)] += n
+        histogram.count = data.get("count", 0)
+        histogram.total = data.get("sum", 0.0)
+        histogram.min = data.get("min")
+        histogram.max = data.get("max")
+        return histogram
+
+
+# HTTP route timing
+HTTP_SUMMARY_INTERVAL = 1.0  # Route timings refresh the dashboard snapshot at most once a second
+HTTP_SLOWEST_ROUTES = 5  # Routes listed under "slowest_routes"
+
+# Bucket bounds (seconds) exposed to Prometheus
+PROMETHEUS_LATENCY_BUCKETS = [0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60]
+
+
+def _prometheus_labels(labels: Dict[str, Any]) -> str:
+    """Render {k="v",...} with Prometheus escaping"""
+    if not labels:
+        return ""
+    parts = []
+    for key, value in labels.items():
+        value = str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+        parts.append(f'{key}="{value}"')
+    return "{" + ",".join(parts) + "}"
+
+
+def format_prometheus_metric(name: str, metric_type: str, help_text: str,
+                             samples: List[tuple]) -> str:
+    """
+    Render one metric family in the Prometheus text exposition format.
+
+    Args:
+        name: Metric family name
+        metric_type: counter, gauge or histogram
+        help_text: HELP line text
+        samples: (suffix, labels dict, value) tuples; suffix is "" or e.g. "_bucket"
+
+    Returns:
+        Text block ending in a newline
+    """
+    lines = [f"# HELP {name} {help_text}", f"# TYPE {name} {metric_type}"]
+    for suffix, labels, value in samples:
+        lines.append(f"{name}{suffix}{_prometheus_labels(labels)} {value}")
+    return "\n".join(lines) + "\n"
+
+
+def format_prometheus_histogram(name: str, help_text: str,
+                                histograms: Dict[str, LatencyHistogram],
+                                label: str) -> str:
+    """Render LatencyHistograms keyed by a label value as one histogram family"""
+    samples = []
+    for label_value, histogram in histograms.items():
+        cumulative = histogram.cumulative_counts(PROMETHEUS_LATENCY_BUCKETS)
+        for bound, count in zip(PROMETHEUS_LATENCY_BUCKETS, cumulative):
+            samples.append(("_bucket", {label: label_value, "le": bound}, count))
+        samples.append(("_bucket", {label: label_value, "le": "+Inf"}, histogram.count))
+        samples.append(("_sum", {label: label_value}, histogram.total))
+        samples.append(("_count", {label: label_value}, histogram.count))
+    return format_prometheus_metric(name, "histogram", help_text, samples)
+
+
+PROCESS_START_TIME = time.time()
+
+
+def format_process_metrics() -> str:
+    """Render standard process_* metrics for this process"""
+    usage = resource.getrusage(resource.RUSAGE_SELF)
+    rss = usage.ru_maxrss * 1024  # Peak RSS in KB on Linux; fallback only
+    open_fds = None
+    try:
+        with open("/proc/self/statm") as f:
+            rss = int(f.read().split()[1]) * resource.getpagesize()
+        open_fds = len(os.listdir("/proc/self/fd"))
+    except OSError:
+        pass
+
+    blocks = [
+        format_prometheus_metric(
+            "process_cpu_seconds_total", "counter", "Total user and system CPU time in seconds",
+            [("", {}, usage.ru_utime + usage.ru_stime)]
+        ),
+        format_prometheus_metric(
+            "process_resident_memory_bytes", "gauge", "Resident memory size in bytes",
+            [("", {}, rss)]
+        ),
+        format_prometheus_metric(
+            "process_start_time_seconds", "gauge", "Start time of the process since the epoch",
+            [("", {}, PROCESS_START_TIME)]
+        ),
+        format_prometheus_metric(
+            "process_threads", "gauge", "Python threads in the process",
+            [("", {}, threading.active_count())]
+        )
+    ]
+    if open_fds is not None:
+        blocks.append(format_prometheus_metric(
+            "process_open_fds", "gauge", "Open file descriptors", [("", {}, open_fds)]
+        ))
+    return "".join(blocks)
+
+
 class PromuraLogger:
     """Comprehensive logging system with metrics tracking"""
 
@@ -30,12 +388,15 @@ class PromuraLogger:
         # Configure Python logging
         self._setup_logging()
 
+        # JSON-lines logs and metrics saves are written off the request path
+        self.writer = BufferedLogWriter()
+
         # Metrics storage
         self.metrics = {
             "api_calls": defaultdict(lambda: {"success": 0, "failure": 0, "total": 0}),
             "posts": defaultdict(lambda: {"completed": 0, "failed": 0, "scheduled": 0}),
             "errors": defaultdict(list),
-            "performance": defaultdict(list),
+            "performance": defaultdict(LatencyHistogram),
             "session_start": datetime.now().isoformat()
         }
 
@@ -43,17 +404,38 @@ class PromuraLogger:
         self.recent_api_calls = deque(maxlen=100)  # Last 100 API calls
         self.recent_errors = deque(maxlen=50)  # Last 50 errors
         self.response_times = deque(maxlen=100)  # Response time tracking
+        self.calls_since_save = 0
+
+        # Running aggregates, updated by each log_* call
+        self.api_totals = {"success": 0, "total": 0}
+        self.response_time_sum = 0.0  # Sum of self.response_times
+        self.error_counts: Dict[str, int] = {}
+        self.overall_latency = LatencyHistogram()
+
+        # Dashboard snapshot, rebuilt only when version moves
+        self.version = 0
+        self.snapshot: Optional[Dict[str, Any]] = None
+        self.snapshot_version = -1
+        self.listeners: List[Callable[[], None]] = []  # Called after each change
+
+        # Dashboard HTTP timings per route template ("GET /api/queue/{post_id}").
+        # These don't bump self.version; the snapshot picks them up lazily.
+        self.http_routes: Dict[str, Dict[str, Any]] = {}
+        self.http_version = 0
+        self.http_snapshot_version = 0
+        self.http_snapshot_at = 0.0
 
         # Thread safety
-        self.lock = threading.Lock()
+        self.lock = threading.RLock()
 
         # Load existing metrics
         self._load_metrics()
+        self._rebuild_aggregates()
 
         self.logger.info("🚀 PROMURA Logger initialized")
 
     def _setup_logging(self):
-        """Configure Python logging handlers"""
+        """Configure Python logging handlers behind a queue so callers never block on disk"""
         # Main logger
         self.logger = logging.getLogger("PROMURA")
         self.logger.setLevel(logging.DEBUG)
@@ -80,10 +462,15 @@ class PromuraLogger:
         error_handler.setLevel(logging.ERROR)
         error_handler.setFormatter(file_format)
 
-        # Add handlers
-        self.logger.addHandler(console_handler)
-        self.logger.addHandler(file_handler)
-        self.logger.addHandler(error_handler)
+        # Handlers run on a QueueListener thread; the logger only enqueues
+        log_queue = queue.Queue()
+        self.log_listener = logging.handlers.QueueListener(
+            log_queue, console_handler, file_handler, error_handler,
+            respect_handler_level=True
+        )
+        self.log_listener.start()
+        atexit.register(self.log_listener.stop)
+        self.logger.addHandler(logging.handlers.QueueHandler(log_queue))
 
     def _load_metrics(self):
         """Load existing metrics from file"""
@@ -93,29 +480,64 @@ class PromuraLogger:
                     saved_metrics = json.load(f)
                     # Merge with current metrics
                     for key in saved_metrics:
-                        if key != "session_start":
+                        if key == "performance":
+                            # Old files store a list of samples per endpoint
+                            for endpoint, data in saved_metrics[key].items():
+                                self.metrics[key][endpoint] = LatencyHistogram.from_dict(data)
+                        elif key in self.metrics and key != "session_start":
                             self.metrics[key].update(saved_metrics[key])
             except Exception as e:
                 self.logger.warning(f"Could not load metrics: {e}")
 
-    def _save_metrics(self):
-        """Save current metrics to file"""
+    def _rebuild_aggregates(self):
+        """Recompute the running aggregates from the raw metrics"""
         with self.lock:
+            self.api_totals = {
+                "success": sum(stats.get("success", 0) for stats in self.metrics["api_calls"].values()),
+                "total": sum(stats.get("total", 0) for stats in self.metrics["api_calls"].values())
+            }
+            self.error_counts = {
+                error_type: len(errors) for error_type, errors in self.metrics["errors"].items()
+            }
+            self.overall_latency = LatencyHistogram()
+            for histogram in self.metrics["performance"].values():
+                self.overall_latency.merge(histogram)
+            self.version += 1
+
+    def add_listener(self, callback: Callable[[], None]):
+        """Register a callback run (on the logging thread) after every metrics change"""
+        self.listeners.append(callback)
+
+    def _notify_listeners(self):
+        for callback in self.listeners:
             try:
-                # Convert defaultdicts to regular dicts for JSON serialization
+                callback()
+            except Exception as e:
+                self.logger.warning(f"Metrics listener failed: {e}")
+
+    def _save_metrics(self):
+        """Save current metrics to file"""
+        try:
+            # Snapshot under the lock, serialize and write outside it
+            with self.lock:
                 save_data = {
-                    "api_calls": dict(self.metrics["api_calls"]),
-                    "posts": dict(self.metrics["posts"]),
-                    "errors": dict(self.metrics["errors"]),
-                    "performance": dict(self.metrics["performance"]),
+                    "api_calls": {k: dict(v) for k, v in self.metrics["api_calls"].items()},
+                    "posts": {k: dict(v) for k, v in self.metrics["posts"].items()},
+                    "errors": {k: list(v) for k, v in self.metrics["errors"].items()},
+                    "performance": {
+                        endpoint: histogram.to_dict()
+                        for endpoint, histogram in self.metrics["performance"].items()
+                    },
                     "session_start": self.metrics["session_start"],
                     "last_updated": datetime.now().isoformat()
                 }
 
-                with open(self.metrics_log, 'w') as f:
-                    json.dump(save_data, f, indent=2)
-            except Exception as e:
-                self.logger.error(f"Could not save metrics: {e}")
+            tmp_path = self.metrics_log.with_suffix(".json.tmp")
+            with open(tmp_path, 'w') as f:
+                json.dump(save_data, f, indent=2)
+            os.replace(tmp_path, self.metrics_log)
+        except Exception as e:
+            self.logger.error(f"Could not save metrics: {e}")
 
     def log_api_call(self, endpoint: str, method: str, success: bool,
                      response_time: float, details: Optional[Dict] = None):
@@ -123,17 +545,21 @@ class PromuraLogger:
         with self.lock:
             # Update metrics
             self.metrics["api_calls"][endpoint]["total"] += 1
+            self.api_totals["total"] += 1
             if success:
                 self.metrics["api_calls"][endpoint]["success"] += 1
+                self.api_totals["success"] += 1
             else:
                 self.metrics["api_calls"][endpoint]["failure"] += 1
 
             # Track response time
+            if len(self.response_times) == self.response_times.maxlen:
+                self.response_time_sum -= self.response_times[0]
             self.response_times.append(response_time)
-            self.metrics["performance"][endpoint].append({
-                "time": response_time,
-                "timestamp": datetime.now().isoformat()
-            })
+            self.response_time_sum += response_time
+            self.metrics["performance"][endpoint].record(response_time)
+            self.overall_latency.record(response_time)
+            self.version += 1
 
             # Log entry
             log_entry = {
@@ -148,9 +574,8 @@ class PromuraLogger:
             # Add to recent calls
             self.recent_api_calls.append(log_entry)
 
-            # Write to log file
-            with open(self.api_log, 'a') as f:
-                f.write(json.dumps(log_entry) + "\n")
+            # Queue for the log file
+            self.writer.write(self.api_log, json.dumps(log_entry))
 
             # Log to console
             status = "✅" if success else "❌"
@@ -159,9 +584,13 @@ class PromuraLogger:
                 f"({response_time:.2f}s)"
             )
 
-            # Save metrics periodically
-            if len(self.recent_api_calls) % 10 == 0:
-                self._save_metrics()
+            # Save metrics every 10 calls, on the writer thread
+            self.calls_since_save += 1
+            if self.calls_since_save >= 10:
+                self.calls_since_save = 0
+                self.writer.call(self._save_metrics)
+
+        self._notify_listeners()
 
     def log_post_completion(self, post_id: str, status: str,
                            models: List[str], content: str,
@@ -175,6 +604,7 @@ class PromuraLogger:
                 self.metrics["posts"]["overall"]["failed"] += 1
             elif status == "scheduled":
                 self.metrics["posts"]["overall"]["scheduled"] += 1
+            self.version += 1
 
             # Log entry
             log_entry = {
@@ -186,9 +616,8 @@ class PromuraLogger:
                 "schedule_time": schedule_time
             }
 
-            # Write to posts log
-            with open(self.posts_log, 'a') as f:
-                f.write(json.dumps(log_entry) + "\n")
+            # Queue for the posts log
+            self.writer.write(self.posts_log, json.dumps(log_entry))
 
             # Log to console
             emoji = {
@@ -201,6 +630,8 @@ class PromuraLogger:
                 f"{emoji} Post {status}: {post_id} to {len(models)} models"
             )
 
+        self._notify_listeners()
+
     def log_error(self, error_type: str, message: str,
                  details: Optional[Dict] = None, exception: Optional[Exception] = None):
         """Log error with categorization"""
@@ -216,7 +647,9 @@ class PromuraLogger:
 
             # Add to metrics
             self.metrics["errors"][error_type].append(error_entry)
+            self.error_counts[error_type] = self.error_counts.get(error_type, 0) + 1
             self.recent_errors.append(error_entry)
+            self.version += 1
 
             # Log to error logger
             if exception:
@@ -224,8 +657,43 @@ class PromuraLogger:
             else:
                 self.logger.error(f"{error_type}: {message}")
 
-            # Save metrics
-            self._save_metrics()
+            # Save metrics on the writer thread
+            self.writer.call(self._save_metrics)
+
+        self._notify_listeners()
+
+    def log_http_request(self, route: str, method: str, status_code: int,
+                         duration: float, response_size: int = 0):
+        """Record timing for one dashboard HTTP request"""
+        key = f"{method} {route}"
+        status_class = f"{status_code // 100}xx"
+        with self.lock:
+            stats = self.http_routes.get(key)
+            if stats is None:
+                stats = self.http_routes[key] = {
+                    "latency": LatencyHistogram(),
+                    "status": {},
+                    "bytes": 0
+                }
+            stats["latency"].record(duration)
+            stats["status"][status_class] = stats["status"].get(status_class, 0) + 1
+            stats["bytes"] += response_size
+            self.http_version += 1
+
+    def get_route_timings(self, limit: Optional[int] = None) -> List[Dict[str, Any]]:
+        """Per-route latency summaries, slowest p99 first"""
+        with self.lock:
+            routes = [
+                {
+                    "route": key,
+                    **stats["latency"].summary(),
+                    "status": dict(stats["status"]),
+                    "avg_bytes": stats["bytes"] / stats["latency"].count if stats["latency"].count else 0
+                }
+                for key, stats in self.http_routes.items()
+            ]
+        routes.sort(key=lambda route: route["p99"], reverse=True)
+        return routes[:limit] if limit else routes
 
     def get_success_rate(self, endpoint: Optional[str] = None) -> float:
         """Get API success rate"""
@@ -238,30 +706,33 @@ class PromuraLogger:
                 return (stats.get("success", 0) / total) * 100
             else:
                 # Overall success rate
-                total_success = sum(
-                    stats["success"] for stats in self.metrics["api_calls"].values()
-                )
-                total_calls = sum(
-                    stats["total"] for stats in self.metrics["api_calls"].values()
-                )
-                if total_calls == 0:
+                if self.api_totals["total"] == 0:
                     return 0.0
-                return (total_success / total_calls) * 100
+                return (self.api_totals["success"] / self.api_totals["total"]) * 100
 
     def get_average_response_time(self) -> float:
         """Get average API response time"""
-        if not self.response_times:
-            return 0.0
-        return sum(self.response_times) / len(self.response_times)
+        with self.lock:
+            if not self.response_times:
+                return 0.0
+            return max(self.response_time_sum, 0.0) / len(self.response_times)
 
-    def get_error_summary(self) -> Dict[str, int]:
-        """Get summary of errors by type"""
+    def get_latency_percentiles(self) -> Dict[str, Any]:
+        """Get latency percentiles overall and per endpoint"""
         with self.lock:
             return {
-                error_type: len(errors)
-                for error_type, errors in self.metrics["errors"].items()
+                "overall": self.overall_latency.summary(),
+                "endpoints": {
+                    endpoint: histogram.summary()
+                    for endpoint, histogram in self.metrics["performance"].items()
+                }
             }
 
+    def get_error_summary(self) -> Dict[str, int]:
+        """Get summary of errors by type"""
+        with self.lock:
+            return dict(self.error_counts)
+
     def get_post_statistics(self) -> Dict[str, Any]:
         """Get post completion statistics"""
         with self.lock:
@@ -278,28 +749,121 @@ class PromuraLogger:
                 )
             }
 
+    def get_prometheus_metrics(self) -> str:
+        """
+        Render API, post, error and latency metrics for Prometheus.
+
+        Counters and histograms are copied under the lock and rendered
+        outside it, so scrapes hold the lock only for the copy.
+        """
+        with self.lock:
+            api_calls = {endpoint: dict(stats) for endpoint, stats in self.metrics["api_calls"].items()}
+            posts = dict(self.metrics["posts"].get("overall", {}))
+            error_counts = dict(self.error_counts)
+            latency = {
+                endpoint: histogram.copy()
+                for endpoint, histogram in self.metrics["performance"].items()
+            }
+            http_latency = {key: stats["latency"].copy() for key, stats in self.http_routes.items()}
+            http_status = {key: dict(stats["status"]) for key, stats in self.http_routes.items()}
+
+        api_samples = []
+        for endpoint, stats in api_calls.items():
+            api_samples.append(("", {"endpoint": endpoint, "outcome": "success"}, stats.get("success", 0)))
+            api_samples.append(("", {"endpoint": endpoint, "outcome": "failure"}, stats.get("failure", 0)))
+
+        return "".join([
+            format_prometheus_metric(
+                "promura_api_calls_total", "counter",
+                "OnlySnarf API calls by endpoint and outcome", api_samples
+            ),
+            format_prometheus_metric(
+                "promura_posts_total", "counter", "Posts by final status",
+                [("", {"status": status}, posts.get(status, 0))
+                 for status in ("completed", "failed", "scheduled")]
+            ),
+            format_prometheus_metric(
+                "promura_errors_total", "counter", "Logged errors by type",
+                [("", {"type": error_type}, count) for error_type, count in error_counts.items()]
+            ),
+            format_prometheus_histogram(
+                "promura_api_call_duration_seconds",
+                "OnlySnarf API call latency by endpoint", latency, "endpoint"
+            ),
+            format_prometheus_metric(
+                "promura_http_responses_total", "counter",
+                "Dashboard HTTP responses by route and status class",
+                [("", {"route": route, "status_class": status_class}, count)
+                 for route, statuses in http_status.items()
+                 for status_class, count in statuses.items()]
+            ),
+            format_prometheus_histogram(
+                "promura_http_request_duration_seconds",
+                "Dashboard HTTP request latency by route", http_latency, "route"
+            )
+        ])
+
+    def get_uptime(self) -> str:
+        """Time since the session started, to the second"""
+        uptime = datetime.now() - datetime.fromisoformat(self.metrics["session_start"])
+        return str(timedelta(seconds=int(uptime.total_seconds())))
+
+    def get_dashboard_snapshot(self) -> tuple:
+        """
+        Get the dashboard metrics and their version.
+
+        The snapshot is rebuilt only when a log_* call has bumped the version
+        since the last build, so repeated polls reuse the same dict. Callers
+        must not mutate it. Uptime is not part of the snapshot.
+
+        Returns:
+            (version, metrics dict)
+        """
+        with self.lock:
+            # Fold in new route timings, but not more than once per interval
+            now = time.monotonic()
+            if (self.http_version != self.http_snapshot_version and
+                    now - self.http_snapshot_at >= HTTP_SUMMARY_INTERVAL):
+                self.http_snapshot_version = self.http_version
+                self.http_snapshot_at = now
+                self.version += 1
+
+            if self.snapshot_version != self.version:
+                latency = self.get_latency_percentiles()
+                avg_response_time = self.get_average_response_time()
+                self.snapshot = {
+                    "version": self.version,
+                    "api": {
+                        "success_rate": self.get_success_rate(),
+                        "avg_response_time": avg_response_time,
+                        "latency": latency["overall"],
+                        "latency_by_endpoint": latency["endpoints"],
+                        "total_calls": self.api_totals["total"],
+                        "recent_calls": list(self.recent_api_calls)[-10:]  # Last 10
+                    },
+                    "posts": self.get_post_statistics(),
+                    "errors": {
+                        "summary": self.get_error_summary(),
+                        "recent": list(self.recent_errors)[-5:]  # Last 5 errors
+                    },
+                    "performance": {
+                        "avg_response_time": f"{avg_response_time:.2f}s",
+                        "p50_response_time": f"{latency['overall']['p50']:.2f}s",
+                        "p99_response_time": f"{latency['overall']['p99']:.2f}s"
+                    },
+                    "http": {
+                        "slowest_routes": self.get_route_timings(HTTP_SLOWEST_ROUTES)
+                    }
+                }
+                self.snapshot_version = self.version
+            return self.version, self.snapshot
+
     def get_dashboard_metrics(self) -> Dict[str, Any]:
         """Get all metrics for dashboard display"""
+        _, snapshot = self.get_dashboard_snapshot()
         return {
-            "api": {
-                "success_rate": self.get_success_rate(),
-                "avg_response_time": self.get_average_response_time(),
-                "total_calls": sum(
-                    stats["total"] for stats in self.metrics["api_calls"].values()
-                ),
-                "recent_calls": list(self.recent_api_calls)[-10:]  # Last 10
-            },
-            "posts": self.get_post_statistics(),
-            "errors": {
-                "summary": self.get_error_summary(),
-                "recent": list(self.recent_errors)[-5:]  # Last 5 errors
-            },
-            "performance": {
-                "uptime": str(
-                    datetime.now() - datetime.fromisoformat(self.metrics["session_start"])
-                ),
-                "avg_response_time": f"{self.get_average_response_time():.2f}s"
-            }
+            **snapshot,
+            "performance": {**snapshot["performance"], "uptime": self.get_uptime()}
         }
 
     def export_logs(self, output_file: Optional[Path] = None) -> Path:
@@ -325,8 +889,9 @@ class PromuraLogger:
     def clear_old_logs(self, days: int = 30):
         """Clear logs older than specified days"""
         cutoff = datetime.now() - timedelta(days=days)
+        self.writer.close()
 
-        for log_file in self.log_dir.glob("*.log"):
+        for log_file in [*self.log_dir.glob("*.log"), *self.log_dir.glob("*.log.*")]:
             if datetime.fromtimestamp(log_file.stat().st_mtime) < cutoff:
                 log_file.unlink()
                 self.logger.info(f"Deleted old log: {log_file.name}")
@@ -1,20 +1,25 @@
 from fastapi import FastAPI, Request, Form, UploadFile, File, HTTPException, Depends, status
-from fastapi.responses import HTMLResponse, JSONResponse, FileResponse
+from fastapi.responses import HTMLResponse, JSONResponse, FileResponse, Response, StreamingResponse
 from fastapi.staticfiles import StaticFiles
 from fastapi.templating import Jinja2Templates
 from fastapi.middleware.cors import CORSMiddleware
 from datetime import datetime
+from collections import OrderedDict
+import asyncio
+import hashlib
 import os
+import threading
 import json
+import time
 import uuid
 from pathlib import Path
 from typing import List, Optional, Dict
 from pydantic import BaseModel
 from app.onlysnarf_client import PromuraClient
-from app.logging_system import logger
+from app.logging_system import logger, format_prometheus_metric, format_process_metrics
 from app.content_library import content_library
-from app.caption_manager import caption_manager
-from app.auth_system import user_manager, audit_logger, get_current_user, require_permission, get_optional_user
+from app.caption_manager import caption_manager, EXPORT_FORMATS
+from app.auth_system import user_manager, audit_logger, login_limiter, get_current_user, require_permission, get_optional_user
 from app.burner_models import burner_manager, PRODUCTION_DEPLOYMENT_MEMORY
 from app.scheduling_ai import scheduling_ai
 from app.template_system import template_manager
@@ -38,7 +43,11 @@ templates = Jinja2Templates(directory="app/templates")
 @app.middleware("http")
 async def track_actions(request: Request, call_next):
     """Track all user actions for audit logging"""
-    # Get current user if authenticated
+    # Static assets need neither auth nor auditing
+    if request.url.path.startswith("/static/"):
+        return await call_next(request)
+
+    # Resolve the user once; route dependencies reuse it from request.state
     user = await get_optional_user(request)
 
     # Log the action
@@ -55,6 +64,30 @@ async def track_actions(request: Request, call_next):
     response = await call_next(request)
     return response
 
+# Registered after track_actions, so it wraps it and times the whole request
+@app.middleware("http")
+async def time_requests(request: Request, call_next):
+    """Record latency per route template, status class and response size"""
+    if request.url.path.startswith("/static/"):
+        return await call_next(request)
+
+    start = time.perf_counter()
+    response = await call_next(request)
+    duration = time.perf_counter() - start
+
+    # The router stores the matched route in the scope, e.g. /api/queue/{post_id}
+    route = request.scope.get("route")
+    route_path = getattr(route, "path", None) or "unmatched"
+
+    logger.log_http_request(
+        route=route_path,
+        method=request.method,
+        status_code=response.status_code,
+        duration=duration,
+        response_size=int(response.headers.get("content-length", 0))
+    )
+    return response
+
 # Initialize OnlySnarf client
 promura = PromuraClient()
 
@@ -87,10 +120,22 @@ class PostEdit(BaseModel):
 
 # ==================== AUTHENTICATION ENDPOINTS ====================
 
+def _check_rate_limit(*keys: str):
+    """Raise 429 when any of the rate limit buckets is empty"""
+    if not login_limiter.allow(*keys):
+        raise HTTPException(
+            status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+            detail="Too many attempts. Please try again later.",
+            headers={"Retry-After": str(login_limiter.retry_after(*keys))}
+        )
+
 @app.post("/api/auth/login")
-async def login(login_data: LoginRequest):
+async def login(login_data: LoginRequest, request: Request):
     """Login endpoint"""
-    user = user_manager.authenticate_user(login_data.username, login_data.password)
+    client_ip = request.client.host if request.client else "unknown"
+    _check_rate_limit(f"ip:{client_ip}", f"user:{login_data.username}")
+
+    user = await user_manager.authenticate_user_async(login_data.username, login_data.password)
 
     if not user:
         # Log failed attempt
@@ -142,7 +187,10 @@ async def change_password(
     current_user: Dict = Depends(get_current_user)
 ):
     """Change user password"""
-    success = user_manager.change_password(
+    # Separate bucket from login, so password attempts can't lock out logins
+    _check_rate_limit(f"password:{current_user['username']}")
+
+    success = await user_manager.change_password_async(
         current_user["username"],
         password_data.old_password,
         password_data.new_password
@@ -170,19 +218,40 @@ async def list_users(current_user: Dict = Depends(require_permission("all"))):
 @app.get("/api/audit/logs")
 async def get_audit_logs(
     limit: int = 100,
+    cursor: Optional[str] = None,
+    since: Optional[str] = None,
+    until: Optional[str] = None,
+    action: Optional[str] = None,
+    username: Optional[str] = None,
     current_user: Dict = Depends(require_permission("all"))
 ):
-    """Get audit logs - requires owner permission"""
-    return audit_logger.get_recent_logs(limit)
+    """Get audit logs newest first, paginated with next_cursor - requires owner permission"""
+    try:
+        return audit_logger.query_logs(
+            username=username, action=action, since=since, until=until,
+            cursor=cursor, limit=min(limit, 1000)
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
 
 @app.get("/api/audit/user/{username}")
 async def get_user_logs(
     username: str,
     limit: int = 100,
+    cursor: Optional[str] = None,
+    since: Optional[str] = None,
+    until: Optional[str] = None,
+    action: Optional[str] = None,
     current_user: Dict = Depends(require_permission("all"))
 ):
-    """Get audit logs for specific user - requires owner permission"""
-    return audit_logger.get_user_logs(username, limit)
+    """Get audit logs for specific user, paginated with next_cursor - requires owner permission"""
+    try:
+        return audit_logger.query_logs(
+            username=username, action=action, since=since, until=until,
+            cursor=cursor, limit=min(limit, 1000)
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
 
 # ==================== TEAM MANAGEMENT ENDPOINTS ====================
 
@@ -199,12 +268,13 @@ async def add_user(
     current_user: Dict = Depends(require_permission("all"))
 ):
     """Add a new team member - requires owner permission"""
+    username_taken = HTTPException(
+        status_code=status.HTTP_400_BAD_REQUEST,
+        detail=f"Username {user_data.username} already exists"
+    )
     # Check if username already exists
     if user_manager.get_user(user_data.username):
-        raise HTTPException(
-            status_code=status.HTTP_400_BAD_REQUEST,
-            detail=f"Username {user_data.username} already exists"
-        )
+        raise username_taken
 
     # Get permissions based on role
     permission_map = {
@@ -214,9 +284,14 @@ async def add_user(
     }
     permissions = permission_map.get(user_data.role, ["view"])
 
+    password_hash = await user_manager.hash_password_async(user_data.password)
+    # Check again: another request may have added the name while we hashed
+    if user_manager.get_user(user_data.username):
+        raise username_taken
+
     # Add user to the system
     user_dict = {
-        "password": user_manager._hash_password(user_data.password),
+        "password": password_hash,
         "role": user_data.role,
         "permissions": permissions,
         "email": user_data.email,
@@ -293,8 +368,7 @@ async def delete_user(
         )
 
     # Delete the user
-    del user_manager.users[username]
-    user_manager._save_users()
+    user_manager.delete_user(username)
 
     # Log the action
     audit_logger.log_action(
@@ -414,6 +488,33 @@ async def get_motivational_quotes():
             "author": "Anonymous"
         }]
 
+UPLOAD_CHUNK_SIZE = 1024 * 1024  # Bytes held in memory per upload while streaming it to disk
+
+def _write_chunk(handle, hasher, chunk: bytes):
+    handle.write(chunk)
+    if hasher is not None:
+        hasher.update(chunk)
+
+async def _stream_upload(file: UploadFile, dest: Path, hasher=None) -> int:
+    """
+    Copy an upload to dest one chunk at a time, feeding hasher as it goes.
+
+    The data lands in a .part file that is renamed to dest once complete, so
+    dest never holds a partial upload. Returns the number of bytes written.
+    """
+    part_path = dest.with_name(dest.name + ".part")
+    size = 0
+    try:
+        with open(part_path, "wb") as handle:
+            while chunk := await file.read(UPLOAD_CHUNK_SIZE):
+                await asyncio.to_thread(_write_chunk, handle, hasher, chunk)
+                size += len(chunk)
+        os.replace(part_path, dest)
+    except BaseException:
+        part_path.unlink(missing_ok=True)
+        raise
+    return size
+
 @app.post("/schedule-post")
 async def schedule_post(
     request: Request,
@@ -444,8 +545,7 @@ async def schedule_post(
                 media_item = content_library.get_media_by_id(media_id)
                 if media_item:
                     # Get the actual file path
-                    media_type = "images" if media_item["type"] == "image" else "videos"
-                    file_path = Path("static/library") / media_type / "original" / media_item["filename"]
+                    file_path = content_library.get_media_path(media_item)
                     all_media_files.append({
                         "path": str(file_path),
                         "source": "library",
@@ -465,9 +565,7 @@ async def schedule_post(
             if file.filename:
                 timestamp = datetime.now().timestamp()
                 file_path = upload_dir / f"{timestamp}_{file.filename}"
-                with open(file_path, "wb") as buffer:
-                    file_content = await file.read()
-                    buffer.write(file_content)
+                await _stream_upload(file, file_path)
                 saved_files.append(str(file_path))
                 all_media_files.append({
                     "path": str(file_path),
@@ -518,6 +616,8 @@ async def schedule_post(
             media_info = f" with {total_media} media file{'s' if total_media != 1 else ''}" if total_media > 0 else ""
             message = f"✅ Post scheduled for {schedule_time} to {len(selected_models)} models{media_info}!"
 
+        notify_metrics_changed()
+
         return JSONResponse({
             "success": True,
             "message": message,
@@ -536,6 +636,7 @@ async def cancel_post(post_id: str, current_user: Dict = Depends(require_permiss
     for post in scheduled_posts:
         if post["id"] == post_id:
             scheduled_posts.remove(post)
+            notify_metrics_changed()
             return {"success": True, "message": "Post cancelled successfully"}
 
     raise HTTPException(status_code=404, detail="Post not found")
@@ -564,6 +665,7 @@ async def delete_post(post_id: str):
                     os.remove(file_path)
 
             scheduled_posts.remove(post)
+            notify_metrics_changed()
             return {"success": True, "message": "Post deleted successfully"}
 
     raise HTTPException(status_code=404, detail="Post not found")
@@ -594,20 +696,158 @@ async def check_status():
         "scheduled_posts": len(scheduled_posts)
     }
 
+# Live metrics stream settings
+METRICS_STREAM_MIN_INTERVAL = 0.25  # Push at most 4 updates per second per client
+METRICS_STREAM_HEARTBEAT = 15  # Seconds between heartbeats on an idle stream
+METRICS_STREAM_HISTORY = 256  # Recent payloads kept for Last-Event-ID resume
+
+# Serialized /api/metrics body, reused until anything in its key changes.
+# Each new payload gets an event id for the SSE stream.
+metrics_response_cache = {"key": None, "body": b"", "payload": None, "event_id": 0}
+metrics_history: "OrderedDict[int, Dict]" = OrderedDict()
+# Event ids are "<boot id>-<n>" so ids from before a restart never match the new history
+metrics_boot_id = uuid.uuid4().hex[:12]
+metrics_stream = {"loop": None, "changed": None}
+
+def build_metrics_payload() -> tuple:
+    """Return (event_id, payload dict, JSON body) for the current metrics"""
+    version, snapshot = logger.get_dashboard_snapshot()
+    system = (
+        system_status["online"],
+        system_status["last_check"],
+        len(scheduled_posts),
+        len(completed_posts)
+    )
+    uptime = logger.get_uptime()
+    key = (version, system, uptime)
+
+    if metrics_response_cache["key"] != key:
+        metrics = {
+            **snapshot,
+            "performance": {**snapshot["performance"], "uptime": uptime},
+            # Add additional real-time information
+            "system": {
+                "online": system[0],
+                "last_check": system[1].isoformat(),
+                "scheduled_posts": system[2],
+                "completed_posts": system[3]
+            }
+        }
+        metrics_response_cache["event_id"] += 1
+        metrics_response_cache["payload"] = metrics
+        metrics_response_cache["body"] = json.dumps(metrics).encode("utf-8")
+        metrics_response_cache["key"] = key
+
+        metrics_history[metrics_response_cache["event_id"]] = metrics
+        while len(metrics_history) > METRICS_STREAM_HISTORY:
+            metrics_history.popitem(last=False)
+
+    return (
+        metrics_response_cache["event_id"],
+        metrics_response_cache["payload"],
+        metrics_response_cache["body"]
+    )
+
+def _wake_metrics_streams():
+    """Release every stream waiting on the current change event"""
+    metrics_stream["changed"].set()
+    metrics_stream["changed"] = asyncio.Event()
+
+def notify_metrics_changed():
+    """Wake metrics stream clients; safe to call from any thread"""
+    loop = metrics_stream["loop"]
+    if loop is not None and not loop.is_closed():
+        loop.call_soon_threadsafe(_wake_metrics_streams)
+
+logger.add_listener(notify_metrics_changed)
+
 @app.get("/api/metrics")
 async def get_metrics():
     """Get comprehensive system metrics for dashboard display"""
-    metrics = logger.get_dashboard_metrics()
+    _, metrics, body = build_metrics_payload()
 
-    # Add additional real-time information
-    metrics["system"] = {
-        "online": system_status["online"],
-        "last_check": system_status["last_check"].isoformat(),
-        "scheduled_posts": len(scheduled_posts),
-        "completed_posts": len(completed_posts)
-    }
+    return Response(
+        content=body,
+        media_type="application/json",
+        headers={"X-Metrics-Version": str(metrics["version"])}
+    )
+
+@app.get("/api/metrics/stream")
+async def stream_metrics(request: Request):
+    """Server-Sent Events stream of metric changes
+
+    The first event carries the full payload, later events only the
+    top-level sections that changed. Reconnecting with Last-Event-ID
+    resumes from that payload when it is still in the history and was
+    sent by this process; otherwise the full payload is sent again.
+    """
+    if metrics_stream["loop"] is None:
+        metrics_stream["loop"] = asyncio.get_running_loop()
+        metrics_stream["changed"] = asyncio.Event()
+
+    boot_id, _, last_seq = request.headers.get("Last-Event-ID", "").partition("-")
+    last_payload = None
+    if boot_id == metrics_boot_id and last_seq.isdigit():
+        last_payload = metrics_history.get(int(last_seq))
+
+    async def event_stream():
+        nonlocal last_payload
+        yield "retry: 3000\n\n"
+
+        while not await request.is_disconnected():
+            changed = metrics_stream["changed"]
+            event_id, payload, _ = build_metrics_payload()
+            delta = {
+                key: value for key, value in payload.items()
+                if last_payload is None or last_payload.get(key) != value
+            }
+
+            if delta:
+                yield f"id: {metrics_boot_id}-{event_id}\nevent: metrics\ndata: {json.dumps(delta)}\n\n"
+                last_payload = payload
+            else:
+                yield ": heartbeat\n\n"
+
+            # Coalesce bursts, then wait for the next change or heartbeat
+            await asyncio.sleep(METRICS_STREAM_MIN_INTERVAL)
+            try:
+                await asyncio.wait_for(changed.wait(), timeout=METRICS_STREAM_HEARTBEAT)
+            except asyncio.TimeoutError:
+                pass
+
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+@app.get("/metrics/prometheus")
+async def prometheus_metrics():
+    """Prometheus/OpenMetrics text exposition of dashboard metrics"""
+    gauges = "".join([
+        format_prometheus_metric(
+            "promura_scheduled_posts", "gauge", "Posts waiting in the schedule queue",
+            [("", {}, len(scheduled_posts))]
+        ),
+        format_prometheus_metric(
+            "promura_completed_posts", "gauge", "Posts in the completed history",
+            [("", {}, len(completed_posts))]
+        ),
+        format_prometheus_metric(
+            "promura_library_items", "gauge", "Content library items by type",
+            [("", {"type": "image"}, len(content_library.media["images"])),
+             ("", {"type": "video"}, len(content_library.media["videos"]))]
+        ),
+        format_prometheus_metric(
+            "promura_captions", "gauge", "Captions in the caption library",
+            [("", {}, len(caption_manager.captions))]
+        )
+    ])
 
-    return metrics
+    return Response(
+        content=logger.get_prometheus_metrics() + gauges + format_process_metrics(),
+        media_type="text/plain; version=0.0.4; charset=utf-8"
+    )
 
 @app.get("/api/logs/export")
 async def export_logs():
@@ -621,10 +861,31 @@ async def export_logs():
 
 # Content Library API Endpoints
 @app.get("/api/library")
-async def get_content_library(media_type: Optional[str] = None, tags: Optional[str] = None):
-    """Get all media in content library"""
+async def get_content_library(media_type: Optional[str] = None, tags: Optional[str] = None,
+                              tag_match: str = "any", limit: Optional[int] = None,
+                              cursor: Optional[str] = None, sort: Optional[str] = None,
+                              fields: Optional[str] = None):
+    """
+    Get media in content library (tag_match: "any" or "all" of tags).
+
+    Without paging parameters the full list is returned. With any of limit,
+    cursor, sort or fields the response is one page:
+    {"media": [...], "next_cursor": ..., "total": ...}. Pages carry only
+    id, thumbnail_url, type and dimensions unless fields names others
+    (fields=all for whole entries).
+    """
     tags_list = tags.split(",") if tags else None
-    media = content_library.get_all_media(media_type, tags_list)
+    if limit is not None or cursor or sort or fields:
+        try:
+            return content_library.get_media_page(
+                media_type=media_type, tags=tags_list, match_all=tag_match == "all",
+                sort=sort or "upload_date", cursor=cursor, limit=limit,
+                fields=[f.strip() for f in fields.split(",") if f.strip()] if fields else None
+            )
+        except ValueError as e:
+            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+
+    media = content_library.get_all_media(media_type, tags_list, match_all=tag_match == "all")
     return media
 
 @app.get("/api/library/search")
@@ -643,19 +904,28 @@ async def get_library_stats():
 async def upload_to_library(file: UploadFile = File(...), tags: str = "", description: str = ""):
     """Upload new media to library"""
     try:
-        # Read file data
-        file_data = await file.read()
+        # Reject unsupported types before reading the body
+        content_library.get_media_type(file.filename)
+
+        # Stream to a staging file, hashing as we go
+        staged_path = content_library.staging_path(file.filename)
+        hasher = hashlib.sha256()
+        await _stream_upload(file, staged_path, hasher)
 
         # Parse tags
         tags_list = [tag.strip() for tag in tags.split(",") if tag.strip()] if tags else []
 
-        # Add to library
-        media_entry = content_library.add_media(
-            file_data=file_data,
-            filename=file.filename,
-            tags=tags_list,
-            description=description
-        )
+        # Add to library (moves the staged file into place)
+        try:
+            media_entry = content_library.add_media(
+                source_path=staged_path,
+                filename=file.filename,
+                content_sha256=hasher.hexdigest(),
+                tags=tags_list,
+                description=description
+            )
+        finally:
+            staged_path.unlink(missing_ok=True)
 
         logger.log(f"Library upload: {file.filename} (ID: {media_entry['id']})")
 
@@ -718,27 +988,15 @@ async def bulk_tag_library_media(request: BulkTagRequest, current_user: Dict = D
     updated_count = 0
     failed_ids = []
 
-    all_media = content_library.get_all_media()
-
     for media_id in request.media_ids:
-        media_item = next((m for m in all_media if m['id'] == media_id), None)
-
-        if media_item:
-            if request.action == 'add':
-                # Add new tags to existing ones
-                existing_tags = set(media_item.get('tags', []))
-                new_tags = existing_tags.union(set(request.tags))
-                media_item['tags'] = list(new_tags)
-            else:  # replace
-                # Replace all tags
-                media_item['tags'] = request.tags
-
+        # 'add' merges with existing tags, 'replace' overwrites them
+        if content_library.set_tags(media_id, request.tags, replace=request.action != 'add'):
             updated_count += 1
         else:
             failed_ids.append(media_id)
 
     # Save updated metadata
-    content_library._save_metadata()
+    content_library.save_metadata()
 
     logger.log(f"Bulk tag {request.action}: {updated_count} items updated by {current_user['username']}")
 
@@ -977,6 +1235,16 @@ async def caption_library_compact(request: Request):
         "request": request
     })
 
+async def _store_parsed_captions(result: Dict):
+    """Add parsed captions; per-row index terms and the file write run in worker threads"""
+    terms = await asyncio.to_thread(caption_manager.prepare_parsed, result)
+    # Only the new rows' index updates run on the loop, a chunk at a time
+    for _ in caption_manager.merge_parsed(result, terms):
+        await asyncio.sleep(0)
+    snapshot = caption_manager.snapshot()
+    path = await asyncio.to_thread(caption_manager.write_snapshot, snapshot)
+    caption_manager.commit_snapshot(snapshot, path)
+
 @app.post("/api/captions/upload")
 async def upload_captions(file: UploadFile = File(...)):
     """Upload Excel file with captions"""
@@ -984,8 +1252,10 @@ async def upload_captions(file: UploadFile = File(...)):
         # Read file content
         contents = await file.read()
 
-        # Process the Excel file using CaptionManager
-        result = caption_manager.process_excel_file(contents, file.filename)
+        # Parse and index the Excel file off the event loop
+        result = await asyncio.to_thread(caption_manager.parse_excel_file, contents, file.filename)
+        if result["success"]:
+            await _store_parsed_captions(result)
 
         if result["success"]:
             print(f"Caption upload: {file.filename} - {result['message']}")
@@ -1009,47 +1279,108 @@ async def upload_captions(file: UploadFile = File(...)):
             "message": f"Error processing file: {str(e)}"
         }, status_code=400)
 
-@app.post("/api/captions/replace-all")
-async def replace_all_captions(file: UploadFile = File(...)):
-    """Replace all existing captions with new Excel file"""
-    try:
-        # 1. DELETE all existing captions from database
-        caption_manager.clear_all_captions()
-        print("Cleared all existing captions for replacement")
-
-        # 2. Read and PROCESS new Excel file
-        contents = await file.read()
-        result = caption_manager.process_excel_file(contents, file.filename)
-
-        if result["success"]:
-            print(f"Caption replacement: {file.filename} - {result['message']}")
-            return JSONResponse({
-                "success": True,
+# Background caption replacement jobs (most recent kept for polling)
+CAPTION_REPLACE_JOBS_KEPT = 20
+caption_replace_jobs: "OrderedDict[str, Dict]" = OrderedDict()
+caption_replace_tasks = set()
+caption_replace_lock = asyncio.Lock()  # One replacement at a time
+
+async def _run_caption_replace(job: Dict, contents: bytes, filename: str):
+    """Parse and index the new captions off the event loop, then swap them in"""
+    async with caption_replace_lock:
+        job["status"] = "running"
+        try:
+            result = await asyncio.to_thread(caption_manager.parse_excel_file, contents, filename)
+            if not result["success"]:
+                raise ValueError(result["message"])
+            staging = await asyncio.to_thread(caption_manager.build_replacement, result)
+
+            # Readers keep seeing the old set until this point
+            caption_manager.replace_store(staging)
+            job.update({
+                "status": "completed",
                 "message": f"All captions replaced. {result['message']}",
-                "captions": result["captions"],
-                "summary": result.get("summary", {})
+                "summary": result["summary"]
             })
-        else:
-            logger.log_error("Caption Upload", f"Caption replacement failed: {result['message']}")
-            return JSONResponse({
-                "success": False,
-                "message": result["message"]
-            }, status_code=400)
+            print(f"Caption replacement: {filename} - {result['message']}")
+        except Exception as e:
+            job.update({"status": "failed", "message": f"Error replacing captions: {str(e)}"})
+            logger.log_error("Caption Upload", f"Caption replacement failed: {str(e)}")
+        job["finished_at"] = datetime.now().isoformat()
 
-    except Exception as e:
-        logger.log_error("Caption Upload", f"Caption replacement error: {str(e)}")
-        return JSONResponse({
-            "success": False,
-            "message": f"Error replacing captions: {str(e)}"
-        }, status_code=400)
+@app.post("/api/captions/replace-all", status_code=202)
+async def replace_all_captions(file: UploadFile = File(...)):
+    """Start replacing all captions with a new Excel file; poll the returned job_id"""
+    contents = await file.read()
+    job = {
+        "job_id": uuid.uuid4().hex,
+        "status": "queued",
+        "filename": file.filename,
+        "message": "Caption replacement queued",
+        "summary": None,
+        "created_at": datetime.now().isoformat(),
+        "finished_at": None
+    }
+    caption_replace_jobs[job["job_id"]] = job
+    while len(caption_replace_jobs) > CAPTION_REPLACE_JOBS_KEPT:
+        caption_replace_jobs.popitem(last=False)
+
+    task = asyncio.create_task(_run_caption_replace(job, contents, file.filename))
+    caption_replace_tasks.add(task)
+    task.add_done_callback(caption_replace_tasks.discard)
+
+    return {"success": True, **job}
+
+@app.get("/api/captions/replace-all/{job_id}")
+async def get_replace_all_job(job_id: str):
+    """Get the status of a caption replacement job"""
+    job = caption_replace_jobs.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return job
+
+def _etag_matches(request: Request, etag: str) -> bool:
+    """Check an If-None-Match header (weak comparison) against an ETag"""
+    header = request.headers.get("if-none-match")
+    if not header:
+        return False
+    if header.strip() == "*":
+        return True
+    return any(tag.strip().removeprefix("W/") == etag for tag in header.split(","))
 
 @app.get("/api/captions")
-async def get_captions(category: Optional[str] = None, search: Optional[str] = None):
-    """Get stored captions, optionally filtered by category or search term"""
+async def get_captions(request: Request, category: Optional[str] = None, search: Optional[str] = None,
+                       limit: Optional[int] = None, cursor: Optional[str] = None,
+                       sort: Optional[str] = None, fields: Optional[str] = None):
+    """
+    Get stored captions, optionally filtered by category or search term.
+
+    Without paging parameters the full list is returned. With any of limit,
+    cursor, sort or fields the response is one page:
+    {"captions": [...], "next_cursor": ..., "total": ..., "version": ...}
+
+    Responses carry the caption version as an ETag; a matching
+    If-None-Match gets 304 Not Modified.
+    """
+    etag = f'"{caption_manager.version}.{caption_manager.usage_version}"'
+    cache_headers = {"ETag": etag, "Cache-Control": "no-cache"}
+    if _etag_matches(request, etag):
+        return Response(status_code=304, headers=cache_headers)
+
+    if limit is not None or cursor or sort or fields:
+        try:
+            page = caption_manager.get_captions_page(
+                category=category, search=search, sort=sort or "default", cursor=cursor,
+                limit=limit, fields=[f.strip() for f in fields.split(",") if f.strip()] if fields else None
+            )
+        except ValueError as e:
+            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+        return JSONResponse(page, headers=cache_headers)
+
     try:
         if search:
-            # Search for captions
-            captions = caption_manager.search_captions(search)
+            # Ranked search, optionally within a category
+            captions = caption_manager.search_captions(search, category)
         elif category:
             # Filter by category
             captions = caption_manager.get_captions_by_category(category)
@@ -1057,12 +1388,19 @@ async def get_captions(category: Optional[str] = None, search: Optional[str] = N
             # Get all captions
             captions = caption_manager.get_all_captions()
 
-        return captions
+        return JSONResponse(captions, headers=cache_headers)
 
     except Exception as e:
         logger.error(f"Error fetching captions: {str(e)}")
         return []
 
+@app.get("/api/captions/changes")
+async def get_caption_changes(since: int, fields: Optional[str] = None):
+    """Get captions inserted, updated or deleted after a version (reset=true means refetch)"""
+    return caption_manager.get_changes(
+        since, fields=[f.strip() for f in fields.split(",") if f.strip()] if fields else None
+    )
+
 @app.post("/api/captions/{caption_id}/use")
 async def use_caption(caption_id: str):
     """Track caption usage"""
@@ -1100,6 +1438,15 @@ async def delete_caption(caption_id: str):
 async def add_single_caption(text: str = Form(...), category: str = Form(...)):
     """Add a single caption manually"""
     try:
+        existing = caption_manager.find_duplicate(text)
+        if existing:
+            return {
+                "success": False,
+                "duplicate": True,
+                "caption": existing,
+                "message": "Caption already exists"
+            }
+
         new_caption = caption_manager.add_single_caption(text, category)
         logger.log(f"Caption added: {new_caption['id']}")
         return {
@@ -1130,6 +1477,18 @@ async def get_recent_captions(limit: int = 10):
     """Get recently added captions"""
     return caption_manager.get_recent_captions(limit)
 
+@app.get("/api/captions/duplicates")
+async def get_duplicate_captions(threshold: float = 0.8):
+    """Get groups of exact and near-duplicate captions"""
+    if not 0 < threshold <= 1:
+        raise HTTPException(status_code=400, detail="threshold must be between 0 and 1")
+    groups = caption_manager.get_duplicate_groups(threshold)
+    return {
+        "groups": groups,
+        "total_groups": len(groups),
+        "total_duplicates": sum(len(group) - 1 for group in groups)
+    }
+
 @app.get("/api/captions/stats")
 async def get_caption_stats():
     """Get caption library statistics"""
@@ -1142,26 +1501,108 @@ async def clear_all_captions():
     print("All captions cleared")
     return {"success": True, "message": "All captions cleared"}
 
-@app.get("/api/captions/export")
-async def export_captions():
-    """Export all captions to Excel file"""
+EXPORT_STREAM_CHUNK = 64 * 1024  # Bytes per streamed response chunk
+EXPORT_STREAM_QUEUE = 16         # Chunks buffered between the writer thread and the response
+
+class _ThreadStreamSink:
+    """Write-only file object filled by a writer thread and drained on the event loop"""
+
+    def __init__(self, loop: asyncio.AbstractEventLoop):
+        self.loop = loop
+        self.queue: asyncio.Queue = asyncio.Queue()
+        self.slots = threading.Semaphore(EXPORT_STREAM_QUEUE)
+        self.buffer = bytearray()
+        self.cancelled = False
+
+    def write(self, data: bytes) -> int:
+        self.buffer += data
+        if len(self.buffer) >= EXPORT_STREAM_CHUNK:
+            self._put(bytes(self.buffer))
+            self.buffer.clear()
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def finish(self, error: Optional[BaseException] = None):
+        if self.buffer and error is None:
+            self._put(bytes(self.buffer))
+        self._put(error)
+
+    def _put(self, item):
+        # Bounded by slots, so a slow client throttles the writer; give up if it left
+        while not self.slots.acquire(timeout=1):
+            if self.cancelled:
+                raise ConnectionAbortedError("Stream cancelled")
+        if self.cancelled:
+            raise ConnectionAbortedError("Stream cancelled")
+        try:
+            self.loop.call_soon_threadsafe(self.queue.put_nowait, item)
+        except RuntimeError:
+            raise ConnectionAbortedError("Event loop closed")
+
+    async def get(self):
+        item = await self.queue.get()
+        self.slots.release()
+        return item
+
+    def cancel(self):
+        self.cancelled = True
+        self.slots.release()  # Wake a writer waiting for a slot
+
+async def _stream_from_thread(produce):
+    """Run produce(sink) in its own writer thread and yield what it writes"""
+    sink = _ThreadStreamSink(asyncio.get_running_loop())
+
+    def run():
+        try:
+            try:
+                produce(sink)
+            except ConnectionAbortedError:
+                raise
+            except Exception as e:
+                sink.finish(e)
+                return
+            sink.finish()
+        except ConnectionAbortedError:
+            pass  # Client went away
+
+    # A dedicated thread, not the default executor: the response side awaits the loop
+    # directly, so concurrent exports can't starve each other of executor workers
+    threading.Thread(target=run, name="export-writer", daemon=True).start()
     try:
-        export_path = Path("exports/captions_export.xlsx")
-        export_path.parent.mkdir(exist_ok=True)
-
-        if caption_manager.export_to_excel(str(export_path)):
-            logger.log("Captions exported to Excel")
-            return FileResponse(
-                path=str(export_path),
-                filename=f"captions_{datetime.now().strftime('%Y%m%d_%H%M%S')}.xlsx",
-                media_type="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
-            )
-        else:
-            raise HTTPException(status_code=400, detail="No captions to export")
-    except Exception as e:
-        logger.error(f"Export failed: {str(e)}")
-        raise HTTPException(status_code=500, detail=str(e))
+        while True:
+            item = await sink.get()
+            if item is None:
+                break
+            if isinstance(item, BaseException):
+                raise item
+            yield item
+    finally:
+        sink.cancel()
+
+@app.get("/api/captions/export")
+async def export_captions(format: str = "xlsx"):
+    """Stream all captions as xlsx, csv or ndjson"""
+    if format not in EXPORT_FORMATS:
+        raise HTTPException(status_code=400, detail=f"format must be one of: {', '.join(EXPORT_FORMATS)}")
+    if not caption_manager.captions:
+        raise HTTPException(status_code=400, detail="No captions to export")
+
+    # Snapshot of references taken on the event loop; rows are written in a thread
+    captions = list(caption_manager.captions.values())
+    media_type, extension = EXPORT_FORMATS[format]
+    filename = f"captions_{datetime.now().strftime('%Y%m%d_%H%M%S')}.{extension}"
+    print(f"Captions export started: {len(captions)} captions as {format}")
+
+    return StreamingResponse(
+        _stream_from_thread(lambda sink: caption_manager.write_export(captions, format, sink)),
+        media_type=media_type,
+        headers={"Content-Disposition": f'attachment; filename="{filename}"'}
+    )
 
 if __name__ == "__main__":
+    # Prefer `uvicorn app.main:app` from the repository root: spawned media
+    # workers re-import the entry module, and this one builds every manager
     import uvicorn
     uvicorn.run(app, host="0.0.0.0", port=8000)
@@ -0,0 +1,46 @@
+"""
+Media Processing
+CPU-heavy derived data for library media, run in worker processes
+"""
+
+from pathlib import Path
+from typing import Dict
+
+from PIL import Image
+
+THUMBNAIL_SIZE = (300, 300)
+THUMBNAIL_QUALITY = 85
+
+
+def process_media(file_path: str, thumb_path: str, media_type: str) -> Dict:
+    """
+    Generate the thumbnail and read dimensions for one media file.
+
+    Runs in a worker process, so it only takes and returns plain values.
+    The image is decoded once; JPEGs are decoded at reduced scale via
+    draft() since only a thumbnail is needed after the size is read.
+
+    Returns:
+        Fields to merge into the library entry (thumbnail is the thumbnail
+        file name, or None when none was made)
+    """
+    if media_type != "images":
+        # Videos have no frame extraction yet
+        return {"thumbnail": None}
+
+    with Image.open(file_path) as img:
+        width, height = img.size
+        image_format = img.format
+        img.draft("RGB", THUMBNAIL_SIZE)
+        img.thumbnail(THUMBNAIL_SIZE, Image.Resampling.LANCZOS)
+        if img.mode not in ("RGB", "L"):
+            img = img.convert("RGB")
+        img.save(thumb_path, "JPEG", quality=THUMBNAIL_QUALITY)
+
+    return {
+        "thumbnail": Path(thumb_path).name,
+        "dimensions": f"{width}x{height}",
+        "width": width,
+        "height": height,
+        "format": image_format
+    }
@@ -0,0 +1,40 @@
+"""
+Paging
+Opaque cursor tokens shared by the paged list endpoints
+"""
+
+import base64
+import json
+from typing import Callable
+
+
+def encode_cursor(payload) -> str:
+    """Pack a cursor payload into an opaque URL-safe token."""
+    raw = json.dumps(payload, separators=(",", ":"), ensure_ascii=False).encode("utf-8")
+    return base64.urlsafe_b64encode(raw).decode("ascii").rstrip("=")
+
+
+def decode_cursor(cursor: str):
+    """Unpack a cursor token; raises ValueError if it is malformed."""
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        return json.loads(raw.decode("utf-8"))
+    except Exception:
+        raise ValueError("Invalid cursor")
+
+
+def is_int(value) -> bool:
+    """Whether a decoded JSON value is an integer (JSON true/false are not)."""
+    return isinstance(value, int) and not isinstance(value, bool)
+
+
+def valid_sort_position(sort: str, position, valid_key: Callable[[str, object], bool]) -> bool:
+    """
+    Whether a decoded cursor is [sort, key, id] for this sort.
+
+    valid_key(sort, key) checks the key has the shape that sort's index uses.
+    """
+    if not isinstance(position, list) or len(position) != 3 or position[0] != sort:
+        return False
+    key, item_id = position[1], position[2]
+    return isinstance(item_id, str) and valid_key(sort, key)
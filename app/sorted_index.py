@@ -0,0 +1,75 @@
+"""
+Sorted Index
+Keeps item ids ordered by a sort key so top-K and paged reads skip sorting
+"""
+
+from bisect import bisect_left, bisect_right, insort
+from typing import Any, Hashable, Iterable, Iterator, List, Optional, Tuple
+
+BULK_INSERT_MIN = 32  # Batches larger than this are appended and sorted once
+
+
+class SortedIndex:
+    """
+    Ascending list of (key, id) pairs.
+
+    Inserts and removes are a binary search plus a list memmove, which stays
+    fast well into six figures of items; batches go through add_many, which
+    sorts once instead of shifting the list per item. Reads are slices, so
+    the top K of any size library costs O(K).
+    """
+
+    def __init__(self):
+        self.entries: List[Tuple[Any, Hashable]] = []
+
+    def __len__(self) -> int:
+        return len(self.entries)
+
+    def add(self, key: Any, item_id: Hashable):
+        """Insert an id under a key."""
+        insort(self.entries, (key, item_id))
+
+    def add_many(self, pairs: Iterable[Tuple[Any, Hashable]]):
+        """Insert several (key, id) pairs."""
+        pairs = list(pairs)
+        if len(pairs) <= BULK_INSERT_MIN:
+            for pair in pairs:
+                insort(self.entries, pair)
+        else:
+            self.entries.extend(pairs)
+            self.entries.sort()
+
+    def remove(self, key: Any, item_id: Hashable) -> bool:
+        """Remove an id previously added under key."""
+        i = bisect_left(self.entries, (key, item_id))
+        if i < len(self.entries) and self.entries[i] == (key, item_id):
+            del self.entries[i]
+            return True
+        return False
+
+    def update(self, old_key: Any, new_key: Any, item_id: Hashable):
+        """Move an id to a new key."""
+        if old_key != new_key:
+            self.remove(old_key, item_id)
+            self.add(new_key, item_id)
+
+    def clear(self):
+        self.entries = []
+
+    def top(self, k: int) -> List[Hashable]:
+        """Ids with the largest keys, largest first."""
+        if k <= 0:
+            return []
+        return [item_id for _, item_id in reversed(self.entries[-k:])]
+
+    def iter_desc(self, before: Optional[Tuple[Any, Hashable]] = None) -> Iterator[Tuple[Any, Hashable]]:
+        """(key, id) pairs from largest to smallest, starting below `before`."""
+        end = bisect_left(self.entries, before) if before is not None else len(self.entries)
+        for i in range(end - 1, -1, -1):
+            yield self.entries[i]
+
+    def iter_asc(self, after: Optional[Tuple[Any, Hashable]] = None) -> Iterator[Tuple[Any, Hashable]]:
+        """(key, id) pairs from smallest to largest, starting above `after`."""
+        start = bisect_right(self.entries, after) if after is not None else 0
+        for i in range(start, len(self.entries)):
+            yield self.entries[i]
@@ -1,11 +1,21 @@
 // Ultra-Compact Caption Library JavaScript
-let allCaptions = [];
+const PAGE_SIZE = 100;
+const CAPTION_FIELDS = 'id,text,category,usage_count';
+const SYNC_INTERVAL = 30000; // Poll for caption changes every 30 seconds
+
+let allCaptions = [];      // Captions loaded so far for the current filter/search
 let activeFilter = 'All';
+let searchText = '';
+let nextCursor = null;
+let loadingPage = false;
+let queryVersion = 0;      // Ignores responses for superseded queries
+let captionsVersion = null; // Server caption version the loaded list reflects
 
 // Initialize on page load
 document.addEventListener('DOMContentLoaded', function() {
     loadCaptions();
     setupEventListeners();
+    setInterval(syncCaptions, SYNC_INTERVAL);
 });
 
 // Setup event listeners
@@ -44,6 +54,16 @@ function setupEventListeners() {
         });
     }
 
+    // Load the next page when scrolled near the bottom
+    const grid = document.getElementById('captionGrid');
+    if (grid) {
+        grid.addEventListener('scroll', () => {
+            if (grid.scrollTop + grid.clientHeight >= grid.scrollHeight - 200) {
+                loadCaptions(true);
+            }
+        });
+    }
+
     // Category filters
     document.querySelectorAll('.pill-mini').forEach(pill => {
         pill.addEventListener('click', function() {
@@ -55,20 +75,87 @@ function setupEventListeners() {
     });
 }
 
-// Load captions from API
-async function loadCaptions() {
+// Load a page of captions from API (append = next page of the current query)
+async function loadCaptions(append = false) {
+    if (append && (!nextCursor || loadingPage)) return;
+    const version = append ? queryVersion : ++queryVersion;
+
+    const params = new URLSearchParams({ limit: PAGE_SIZE, fields: CAPTION_FIELDS });
+    if (activeFilter !== 'All') params.set('category', activeFilter);
+    if (searchText) params.set('search', searchText);
+    if (append) params.set('cursor', nextCursor);
+
+    loadingPage = true;
     try {
-        const response = await fetch('/api/captions');
-        if (response.ok) {
-            allCaptions = await response.json();
+        const response = await fetch(`/api/captions?${params}`);
+        if (response.ok && version === queryVersion) {
+            const page = await response.json();
+            allCaptions = append ? allCaptions.concat(page.captions) : page.captions;
+            nextCursor = page.next_cursor;
+            if (!append) captionsVersion = page.version;
             renderCaptions(allCaptions);
-            updateCount(allCaptions.length);
+            updateCount(page.total ?? allCaptions.length);
         }
     } catch (error) {
         console.error('Error loading captions:', error);
+    } finally {
+        if (version === queryVersion) loadingPage = false;
+    }
+
+    // Keep loading until the grid can scroll
+    const grid = document.getElementById('captionGrid');
+    if (version === queryVersion && nextCursor && grid && grid.scrollHeight <= grid.clientHeight) {
+        loadCaptions(true);
+    }
+}
+
+// Apply caption changes since the loaded version instead of refetching
+async function syncCaptions() {
+    if (captionsVersion === null || loadingPage || document.hidden) return;
+    try {
+        const response = await fetch(`/api/captions/changes?since=${captionsVersion}&fields=${CAPTION_FIELDS}`);
+        if (!response.ok) return;
+        const delta = await response.json();
+        if (delta.reset) {
+            loadCaptions();
+            return;
+        }
+        if (delta.version === captionsVersion) return;
+        captionsVersion = delta.version;
+
+        // Only inserts that belong in the current view need a refetch
+        if (delta.inserts.some(matchesActiveQuery)) {
+            loadCaptions();
+            return;
+        }
+
+        // Patch loaded rows in place; drop rows deleted or moved out of the category
+        const deleted = new Set(delta.deletes);
+        const loaded = new Map(allCaptions.map(c => [c.id, c]));
+        delta.updates.forEach(update => {
+            const existing = loaded.get(update.id);
+            if (!existing) return;
+            Object.assign(existing, update);
+            if (activeFilter !== 'All' && existing.category !== activeFilter) deleted.add(existing.id);
+        });
+        if (delta.updates.length === 0 && !allCaptions.some(c => deleted.has(c.id))) return;
+
+        allCaptions = allCaptions.filter(c => !deleted.has(c.id));
+        renderCaptions(allCaptions);
+    } catch (error) {
+        console.error('Error syncing captions:', error);
     }
 }
 
+// Whether a caption belongs in the current category/search view (mirrors the server match)
+function matchesActiveQuery(caption) {
+    if (activeFilter !== 'All' && caption.category !== activeFilter) return false;
+    if (!searchText) return true;
+    const text = (caption.text || '').toLowerCase();
+    const needle = searchText.toLowerCase();
+    return text.includes(needle) || needle.split(/\s+/).every(word => text.includes(word));
+}
+
 // Render captions in grid
 function renderCaptions(captions) {
     const grid = document.getElementById('captionGrid');
@@ -109,7 +196,7 @@ async function copyCaption(captionId) {
 
             // Update usage count locally
             caption.usage_count = (caption.usage_count || 0) + 1;
-            renderCaptions(getFilteredCaptions());
+            renderCaptions(allCaptions);
         } catch (error) {
             console.error('Error copying caption:', error);
         }
@@ -139,8 +226,15 @@ async function handleExcelUpload(event) {
         const result = await response.json();
 
         if (result.success) {
-            showToast(`Replaced all captions. Added ${result.captions.length} captions`, 'success');
-            await loadCaptions();
+            // Replacement runs in the background; old captions stay until it's done
+            showToast('Replacing captions...', 'info');
+            const job = await waitForReplaceJob(result.job_id);
+            if (job.status === 'completed') {
+                showToast(`Replaced all captions. Added ${job.summary.total} captions`, 'success');
+                await loadCaptions();
+            } else {
+                showToast(job.message || 'Upload failed', 'error');
+            }
         } else {
             showToast(result.message || 'Upload failed', 'error');
         }
@@ -153,6 +247,17 @@ async function handleExcelUpload(event) {
     event.target.value = '';
 }
 
+// Poll a caption replacement job until it finishes
+async function waitForReplaceJob(jobId) {
+    while (true) {
+        await new Promise(resolve => setTimeout(resolve, 1000));
+        const response = await fetch(`/api/captions/replace-all/${jobId}`);
+        const job = await response.json();
+        if (!response.ok) throw new Error(job.detail || 'Replacement job not found');
+        if (job.status === 'completed' || job.status === 'failed') return job;
+    }
+}
+
 // Handle adding single caption
 async function handleAddCaption() {
     const input = document.getElementById('newCaptionInput');
@@ -178,7 +283,7 @@ async function handleAddCaption() {
             input.value = '';
             await loadCaptions();
         } else {
-            showToast('Failed to add caption', 'error');
+            showToast(result.message || 'Failed to add caption', 'error');
         }
     } catch (error) {
         showToast('Error adding caption', 'error');
@@ -186,27 +291,16 @@ async function handleAddCaption() {
     }
 }
 
-// Filter captions by search text
-function filterCaptions(searchText) {
-    const filtered = searchText
-        ? allCaptions.filter(c =>
-            c.text.toLowerCase().includes(searchText.toLowerCase()))
-        : getFilteredCaptions();
-
-    renderCaptions(filtered);
+// Filter captions by search text (searched server-side)
+function filterCaptions(text) {
+    searchText = text.trim();
+    loadCaptions();
 }
 
-// Filter by category
+// Filter by category (filtered server-side)
 function filterByCategory(category) {
-    renderCaptions(getFilteredCaptions());
-}
-
-// Get filtered captions based on active filter
-function getFilteredCaptions() {
-    if (activeFilter === 'All') {
-        return allCaptions;
-    }
-    return allCaptions.filter(c => c.category === activeFilter);
+    activeFilter = category;
+    loadCaptions();
 }
 
 // Update caption count
@@ -1,10 +1,17 @@
 // Caption Library JavaScript Functionality
 document.addEventListener('DOMContentLoaded', function() {
     // Global variables
-    let allCaptions = [];
-    let filteredCaptions = [];
+    const PAGE_SIZE = 60;
+    const CAPTION_FIELDS = 'id,text,category,usage_count,source,created_at';
+    const SYNC_INTERVAL = 30000; // Poll for caption changes every 30 seconds
+    let filteredCaptions = [];   // Captions loaded so far for the current filter/search
     let activeCategory = 'All Categories';
     let captionStats = {};
+    let totalCaptions = 0;
+    let nextCursor = null;
+    let loadingPage = false;
+    let queryVersion = 0;        // Ignores responses for superseded queries
+    let captionsVersion = null;  // Server caption version the loaded list reflects
 
     // Elements
     const uploadZone = document.getElementById('uploadZone');
@@ -20,28 +27,105 @@ document.addEventListener('DOMContentLoaded', function() {
     loadCaptions();
     loadStats();
     setupEventListeners();
+    setInterval(syncCaptions, SYNC_INTERVAL);
 
-    // Load captions from API
-    async function loadCaptions() {
+    // Load a page of captions from API (append = next page of the current query)
+    async function loadCaptions(append = false) {
+        if (append && (!nextCursor || loadingPage)) return;
+        const version = append ? queryVersion : ++queryVersion;
+
+        const params = new URLSearchParams({ limit: PAGE_SIZE, fields: CAPTION_FIELDS });
+        const searchTerm = captionSearch.value.trim();
+        if (activeCategory !== 'All Categories') params.set('category', activeCategory);
+        if (searchTerm) params.set('search', searchTerm);
+        if (append) params.set('cursor', nextCursor);
+
+        loadingPage = true;
         try {
-            const response = await fetch('/api/captions');
-            const captions = await response.json();
-            allCaptions = captions;
-            filteredCaptions = captions;
+            const response = await fetch(`/api/captions?${params}`);
+            const page = await response.json();
+            if (version !== queryVersion) return;
+
+            filteredCaptions = append ? filteredCaptions.concat(page.captions) : page.captions;
+            nextCursor = page.next_cursor;
+            if (!append) captionsVersion = page.version;
+            totalCaptions = page.total ?? filteredCaptions.length;
+
+            if (append) {
+                page.captions.forEach(caption => messagesGrid.appendChild(createMessageCard(caption)));
+                updateCount();
+            } else {
+                renderCaptions();
+            }
+        } catch (error) {
+            console.error('Error loading captions:', error);
+        } finally {
+            if (version === queryVersion) loadingPage = false;
+        }
+    }
 
-            // Update category filters with actual categories
-            updateCategoryFilters();
+    // Apply caption changes since the loaded version instead of refetching
+    async function syncCaptions() {
+        if (captionsVersion === null || loadingPage || document.hidden) return;
+        try {
+            const response = await fetch(`/api/captions/changes?since=${captionsVersion}&fields=${CAPTION_FIELDS}`);
+            if (!response.ok) return;
+            const delta = await response.json();
+            if (delta.reset) {
+                loadCaptions();
+                loadStats();
+                return;
+            }
+            if (delta.version === captionsVersion) return;
+            captionsVersion = delta.version;
+
+            if (delta.inserts.length > 0 || delta.deletes.length > 0) {
+                // Counts and categories may have moved too
+                loadStats();
+            }
+            // Only inserts that belong in the current view need a refetch
+            if (delta.inserts.some(matchesActiveQuery)) {
+                loadCaptions();
+                return;
+            }
+
+            // Patch loaded rows in place; drop rows deleted or moved out of the category
+            const deleted = new Set(delta.deletes);
+            const loaded = new Map(filteredCaptions.map(c => [c.id, c]));
+            delta.updates.forEach(update => {
+                const existing = loaded.get(update.id);
+                if (!existing) return;
+                Object.assign(existing, update);
+                if (activeCategory !== 'All Categories' && existing.category !== activeCategory) {
+                    deleted.add(existing.id);
+                }
+            });
+            if (delta.updates.length === 0 && !filteredCaptions.some(c => deleted.has(c.id))) return;
+
+            const before = filteredCaptions.length;
+            filteredCaptions = filteredCaptions.filter(c => !deleted.has(c.id));
+            totalCaptions -= before - filteredCaptions.length;
             renderCaptions();
         } catch (error) {
-            console.error('Error loading captions:', error);
+            console.error('Error syncing captions:', error);
         }
     }
 
-    // Load statistics
+    // Whether a caption belongs in the current category/search view (mirrors the server match)
+    function matchesActiveQuery(caption) {
+        if (activeCategory !== 'All Categories' && caption.category !== activeCategory) return false;
+        const needle = captionSearch.value.trim().toLowerCase();
+        if (!needle) return true;
+        const text = (caption.text || '').toLowerCase();
+        return text.includes(needle) || needle.split(/\s+/).every(word => text.includes(word));
+    }
+
+    // Load statistics (also provides the category list)
     async function loadStats() {
         try {
             const response = await fetch('/api/captions/stats');
             captionStats = await response.json();
+            updateCategoryFilters();
         } catch (error) {
             console.error('Error loading stats:', error);
         }
@@ -104,6 +188,13 @@ document.addEventListener('DOMContentLoaded', function() {
                 filterCaptions();
             }, 300);
         });
+
+        // Load the next page when scrolled near the bottom
+        window.addEventListener('scroll', () => {
+            if (window.innerHeight + window.scrollY >= document.body.offsetHeight - 400) {
+                loadCaptions(true);
+            }
+        });
     }
 
     // Handle file upload
@@ -135,9 +226,16 @@ document.addEventListener('DOMContentLoaded', function() {
                 body: formData
             });
 
-            const result = await response.json();
+            const started = await response.json();
+            if (!started.success) {
+                showStatus('error', started.message);
+                return;
+            }
+
+            // Replacement runs in the background; old captions stay until it's done
+            const result = await waitForReplaceJob(started.job_id);
 
-            if (result.success) {
+            if (result.status === 'completed') {
                 showStatus('success', result.message);
 
                 // Show summary if available
@@ -161,6 +259,17 @@ document.addEventListener('DOMContentLoaded', function() {
         }
     }
 
+    // Poll a caption replacement job until it finishes
+    async function waitForReplaceJob(jobId) {
+        while (true) {
+            await new Promise(resolve => setTimeout(resolve, 1000));
+            const response = await fetch(`/api/captions/replace-all/${jobId}`);
+            const job = await response.json();
+            if (!response.ok) throw new Error(job.detail || 'Replacement job not found');
+            if (job.status === 'completed' || job.status === 'failed') return job;
+        }
+    }
+
     // Check if file is Excel
     function isExcelFile(file) {
         const validTypes = [
@@ -201,26 +310,16 @@ document.addEventListener('DOMContentLoaded', function() {
         }
     }
 
-    // Filter captions based on category and search
+    // Filter captions based on category and search (done server-side)
     function filterCaptions() {
-        const searchTerm = captionSearch.value.toLowerCase();
-
-        filteredCaptions = allCaptions.filter(caption => {
-            const matchesCategory = activeCategory === 'All Categories' || caption.category === activeCategory;
-            const matchesSearch = !searchTerm || caption.text.toLowerCase().includes(searchTerm);
-            return matchesCategory && matchesSearch;
-        });
-
-        renderCaptions();
+        loadCaptions();
     }
 
-    // Update category filters based on loaded captions
+    // Update category filters from the stats category counts
     function updateCategoryFilters() {
         const categories = new Set(['All Categories']);
-        allCaptions.forEach(caption => {
-            if (caption.category) {
-                categories.add(caption.category);
-            }
+        Object.keys(captionStats.categories || {}).forEach(category => {
+            categories.add(category);
         });
 
         // Get unique categories and sort them
@@ -249,10 +348,14 @@ document.addEventListener('DOMContentLoaded', function() {
         }
     }
 
+    // Update the caption count
+    function updateCount() {
+        captionCount.textContent = `${totalCaptions} caption${totalCaptions !== 1 ? 's' : ''}`;
+    }
+
     // Render captions to the grid
     function renderCaptions() {
-        // Update count
-        captionCount.textContent = `${filteredCaptions.length} caption${filteredCaptions.length !== 1 ? 's' : ''}`;
+        updateCount();
 
         // Clear grid
         messagesGrid.innerHTML = '';
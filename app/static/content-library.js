@@ -1,10 +1,18 @@
 // Content Library Management System
+const LIBRARY_PAGE_SIZE = 60;
+const LIBRARY_FIELDS = 'id,type,url,thumbnail_url,dimensions,filename,file_size,used_count,upload_date,tags';
+const LIBRARY_SORTS = { recent: 'upload_date', popular: 'used_count', size: 'size', name: 'name' };
+
 class ContentLibraryManager {
     constructor() {
-        this.media = [];
+        this.media = [];            // Items loaded so far for the current filter/sort
         this.currentFilter = 'all';
         this.currentSort = 'recent';
         this.selectedMedia = [];
+        this.nextCursor = null;
+        this.loadingPage = false;
+        this.queryVersion = 0;      // Ignores responses for superseded queries
+        this.searching = false;     // Showing search results rather than pages
         this.init();
     }
 
@@ -14,13 +22,39 @@ class ContentLibraryManager {
         await this.loadStats();
     }
 
-    async loadLibrary() {
+    // Load a page of media (append = next page of the current filter/sort)
+    async loadLibrary(append = false) {
+        if (append && (!this.nextCursor || this.loadingPage)) return;
+        const version = append ? this.queryVersion : ++this.queryVersion;
+
+        const params = new URLSearchParams({
+            limit: LIBRARY_PAGE_SIZE,
+            fields: LIBRARY_FIELDS,
+            sort: LIBRARY_SORTS[this.currentSort] || 'upload_date'
+        });
+        if (this.currentFilter !== 'all') params.set('media_type', this.currentFilter);
+        if (append) params.set('cursor', this.nextCursor);
+
+        this.loadingPage = true;
         try {
-            const response = await fetch('/api/library');
-            this.media = await response.json();
-            this.renderLibrary();
+            const response = await fetch(`/api/library?${params}`);
+            const page = await response.json();
+            if (version !== this.queryVersion) return;
+
+            this.searching = false;
+            this.media = append ? this.media.concat(page.media) : page.media;
+            this.nextCursor = page.next_cursor;
+
+            const grid = document.getElementById('libraryGrid');
+            if (append && grid) {
+                grid.insertAdjacentHTML('beforeend', page.media.map(item => this.createMediaCard(item)).join(''));
+            } else {
+                this.renderLibrary();
+            }
         } catch (error) {
             console.error('Error loading library:', error);
+        } finally {
+            if (version === this.queryVersion) this.loadingPage = false;
         }
     }
 
@@ -46,7 +80,11 @@ class ContentLibraryManager {
                 document.querySelectorAll('.btn-library-filter').forEach(b => b.classList.remove('active'));
                 btn.classList.add('active');
                 this.currentFilter = btn.dataset.filter;
-                this.renderLibrary();
+                if (this.searching) {
+                    this.renderLibrary();
+                } else {
+                    this.loadLibrary();
+                }
             });
         });
 
@@ -67,16 +105,35 @@ class ContentLibraryManager {
         if (sortSelect) {
             sortSelect.addEventListener('change', (e) => {
                 this.currentSort = e.target.value;
-                this.sortMedia();
-                this.renderLibrary();
+                if (this.searching) {
+                    this.sortMedia();
+                    this.renderLibrary();
+                } else {
+                    this.loadLibrary();
+                }
             });
         }
+
+        // Load the next page when the bottom of the grid scrolls into view
+        window.addEventListener('scroll', () => {
+            const grid = document.getElementById('libraryGrid');
+            if (grid && grid.offsetParent !== null &&
+                grid.getBoundingClientRect().bottom <= window.innerHeight + 400) {
+                this.loadLibrary(true);
+            }
+        });
     }
 
     async searchLibrary(query) {
+        const version = ++this.queryVersion;
         try {
             const response = await fetch(`/api/library/search?q=${encodeURIComponent(query)}`);
-            this.media = await response.json();
+            const results = await response.json();
+            if (version !== this.queryVersion) return;
+
+            this.searching = true;
+            this.nextCursor = null;
+            this.media = results;
             this.renderLibrary();
         } catch (error) {
             console.error('Error searching library:', error);
@@ -88,6 +145,9 @@ class ContentLibraryManager {
             case 'popular':
                 this.media.sort((a, b) => b.used_count - a.used_count);
                 break;
+            case 'size':
+                this.media.sort((a, b) => (b.file_size_bytes || 0) - (a.file_size_bytes || 0));
+                break;
             case 'name':
                 this.media.sort((a, b) => a.filename.localeCompare(b.filename));
                 break;
@@ -235,8 +295,9 @@ async function useInPost(mediaId) {
         // Notify user
         showNotification('Media added to post', 'success');
 
-        // Reload library to show updated usage count
-        await libraryManager.loadLibrary();
+        // Show the updated usage count without reloading the library
+        media.used_count = (media.used_count || 0) + 1;
+        libraryManager.renderLibrary();
     } catch (error) {
         console.error('Error using media:', error);
         showNotification('Failed to add media', 'error');
@@ -238,8 +238,8 @@ function updateMediaPreview() {
         div.innerHTML = `
             <div class="preview-badge">Library</div>
             ${media.type === 'image' ?
-                `<img src="${media.url}" alt="${media.filename}">` :
-                `<video src="${media.url}"></video>`}
+                `<img src="${media.thumbnail_url || media.url}" alt="${media.filename}">` :
+                `<video src="${media.url || media.thumbnail_url}"></video>`}
             <button class="remove-preview" onclick="removeLibraryMedia('${media.id}')">×</button>
         `;
         previewGrid.appendChild(div);
@@ -286,28 +286,53 @@ function closeLibraryModal() {
     }
 }
 
-// Load library content for selection
-async function loadLibraryForSelection() {
+// Library picker paging
+const LIBRARY_PICKER_PAGE = 60;
+const LIBRARY_PICKER_FIELDS = 'id,thumbnail_url,type,dimensions,filename';
+let libraryPickerItems = {};      // id -> item for everything shown in the picker
+let libraryPickerFilter = 'all';
+let libraryPickerCursor = null;
+let libraryPickerLoading = false;
+let libraryPickerQuery = 0;       // Ignores responses for superseded queries
+
+// Load library content for selection (append = next page of the current filter)
+async function loadLibraryForSelection(append = false) {
+    if (append && (!libraryPickerCursor || libraryPickerLoading)) return;
+    const version = append ? libraryPickerQuery : ++libraryPickerQuery;
+
+    const params = new URLSearchParams({ limit: LIBRARY_PICKER_PAGE, fields: LIBRARY_PICKER_FIELDS });
+    if (libraryPickerFilter !== 'all') params.set('media_type', libraryPickerFilter);
+    if (append) params.set('cursor', libraryPickerCursor);
+
+    libraryPickerLoading = true;
     try {
-        const response = await fetch('/api/library');
-        const media = await response.json();
-        renderLibraryModal(media);
+        const response = await fetch(`/api/library?${params}`);
+        const page = await response.json();
+        if (version !== libraryPickerQuery) return;
+
+        libraryPickerCursor = page.next_cursor;
+        renderLibraryModal(page.media, append);
     } catch (error) {
         console.error('Error loading library:', error);
+    } finally {
+        if (version === libraryPickerQuery) libraryPickerLoading = false;
     }
 }
 
-// Render library items in modal
-function renderLibraryModal(media) {
+// Render library items in modal (append adds them after those already shown)
+function renderLibraryModal(media, append = false) {
     const grid = document.getElementById('libraryModalGrid');
     if (!grid) return;
 
-    if (media.length === 0) {
+    if (!append) libraryPickerItems = {};
+    media.forEach(item => { libraryPickerItems[item.id] = item; });
+
+    if (!append && media.length === 0) {
         grid.innerHTML = '<p class="empty-message">No media in library yet</p>';
         return;
     }
 
-    grid.innerHTML = media.map(item => `
+    const html = media.map(item => `
         <div class="library-modal-item ${selectedLibraryMedia.find(m => m.id === item.id) ? 'selected' : ''}"
              data-media-id="${item.id}" onclick="toggleLibraryItem('${item.id}')">
             <div class="item-checkbox">
@@ -322,11 +347,17 @@ function renderLibraryModal(media) {
                 </div>`}
             <div class="item-info">
                 <span class="item-name">${item.filename}</span>
-                <span class="item-meta">${item.file_size}</span>
+                <span class="item-meta">${item.dimensions || item.file_size || ''}</span>
             </div>
         </div>
     `).join('');
 
+    if (append) {
+        grid.insertAdjacentHTML('beforeend', html);
+    } else {
+        grid.innerHTML = html;
+    }
+
     updateModalSelectionCount();
 }
 
@@ -337,17 +368,13 @@ function toggleLibraryItem(mediaId) {
     if (existingIndex >= 0) {
         selectedLibraryMedia.splice(existingIndex, 1);
     } else {
-        // Fetch media details and add to selection
-        fetch('/api/library')
-            .then(res => res.json())
-            .then(media => {
-                const item = media.find(m => m.id === mediaId);
-                if (item) {
-                    selectedLibraryMedia.push(item);
-                    updateModalSelectionCount();
-                }
-            });
+        // Details come from the page already loaded into the picker
+        const item = libraryPickerItems[mediaId];
+        if (item) {
+            selectedLibraryMedia.push(item);
+        }
     }
+    updateModalSelectionCount();
 
     // Update visual state
     const itemElement = document.querySelector(`[data-media-id="${mediaId}"]`);
@@ -392,8 +419,11 @@ document.addEventListener('DOMContentLoaded', function() {
         modalSearch.addEventListener('input', debounce(async (e) => {
             const query = e.target.value.trim();
             if (query) {
+                const version = ++libraryPickerQuery;
+                libraryPickerCursor = null;
                 const response = await fetch(`/api/library/search?q=${encodeURIComponent(query)}`);
                 const results = await response.json();
+                if (version !== libraryPickerQuery) return;
                 renderLibraryModal(results);
             } else {
                 loadLibraryForSelection();
@@ -407,13 +437,20 @@ document.addEventListener('DOMContentLoaded', function() {
             document.querySelectorAll('.btn-modal-filter').forEach(b => b.classList.remove('active'));
             btn.classList.add('active');
 
-            const filter = btn.dataset.filter;
-            const url = filter === 'all' ? '/api/library' : `/api/library?media_type=${filter}`;
-            const response = await fetch(url);
-            const media = await response.json();
-            renderLibraryModal(media);
+            libraryPickerFilter = btn.dataset.filter;
+            loadLibraryForSelection();
         });
     });
+
+    // Load the next page when the picker grid is scrolled near the bottom
+    const modalGrid = document.getElementById('libraryModalGrid');
+    if (modalGrid) {
+        modalGrid.addEventListener('scroll', () => {
+            if (modalGrid.scrollTop + modalGrid.clientHeight >= modalGrid.scrollHeight - 200) {
+                loadLibraryForSelection(true);
+            }
+        });
+    }
 });
 
 // Show notification
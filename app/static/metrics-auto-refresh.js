@@ -1,10 +1,16 @@
 /**
  * Auto-Refresh Metrics System
  * Updates metrics dashboard without page reload
+ *
+ * Holds one Server-Sent Events connection to /api/metrics/stream and merges
+ * the changed sections it receives. Falls back to polling /api/metrics
+ * every 5 seconds when EventSource is not available.
  */
 
 let metricsRefreshInterval = null;
+let metricsEventSource = null;
 let isRefreshing = false;
+let liveMetrics = {};
 
 // Initialize metrics auto-refresh
 document.addEventListener('DOMContentLoaded', function() {
@@ -16,6 +22,18 @@ document.addEventListener('DOMContentLoaded', function() {
 
 // Start auto-refresh
 function startMetricsAutoRefresh() {
+    if (metricsEventSource || metricsRefreshInterval) return;
+
+    if (window.EventSource) {
+        // The browser reconnects on its own and sends Last-Event-ID,
+        // so the server only replays what changed while we were away
+        metricsEventSource = new EventSource('/api/metrics/stream');
+        metricsEventSource.addEventListener('metrics', (event) => {
+            applyMetricsUpdate(JSON.parse(event.data));
+        });
+        return;
+    }
+
     // Initial load
     refreshMetrics();
 
@@ -25,12 +43,27 @@ function startMetricsAutoRefresh() {
 
 // Stop auto-refresh
 function stopMetricsAutoRefresh() {
+    if (metricsEventSource) {
+        metricsEventSource.close();
+        metricsEventSource = null;
+    }
     if (metricsRefreshInterval) {
         clearInterval(metricsRefreshInterval);
         metricsRefreshInterval = null;
     }
 }
 
+// Merge changed sections into the current metrics and redraw
+function applyMetricsUpdate(delta) {
+    liveMetrics = { ...liveMetrics, ...delta };
+
+    updateMetricsDisplay(liveMetrics);
+    updateLastRefreshTime();
+
+    // Let page scripts (e.g. metrics.html) redraw from the same data
+    document.dispatchEvent(new CustomEvent('metrics:update', { detail: liveMetrics }));
+}
+
 // Refresh metrics data
 async function refreshMetrics() {
     if (isRefreshing) return;
@@ -42,10 +75,7 @@ async function refreshMetrics() {
         const data = await response.json();
 
         // Update metrics display
-        updateMetricsDisplay(data);
-
-        // Update last refresh time
-        updateLastRefreshTime();
+        applyMetricsUpdate(data);
 
     } catch (error) {
         console.error('Error refreshing metrics:', error);
@@ -8,6 +8,7 @@ import uuid
 from pathlib import Path
 from datetime import datetime
 from typing import List, Dict, Optional
+from app.usage_log import UsageEventLog, write_json_atomic
 
 
 class TemplateManager:
@@ -18,6 +19,18 @@ class TemplateManager:
         self.storage_path.parent.mkdir(exist_ok=True)
         self.templates = self._load_templates()
 
+        # Usage bumps are appended here and folded into templates.json later
+        self.usage_log = UsageEventLog(
+            self.storage_path.with_suffix(".usage.jsonl"), compact=self._save_templates
+        )
+        replayed = False
+        for event in self.usage_log.replay():
+            replayed = self._apply_usage(event["id"], event.get("ts")) or replayed
+        if replayed:
+            self._save_templates()
+        else:
+            self.usage_log.reset()
+
     def _load_templates(self) -> Dict:
         """Load templates from storage"""
         if self.storage_path.exists():
@@ -29,9 +42,9 @@ class TemplateManager:
         return {}
 
     def _save_templates(self):
-        """Save templates to storage"""
-        with open(self.storage_path, 'w', encoding='utf-8') as f:
-            json.dump(self.templates, f, indent=2, ensure_ascii=False)
+        """Save templates to storage (this also compacts the usage log)"""
+        write_json_atomic(self.storage_path, self.templates, indent=2, ensure_ascii=False)
+        self.usage_log.reset()
 
     def create_template(
         self,
@@ -179,13 +192,20 @@ class TemplateManager:
         if template_id not in self.templates:
             return None
 
-        template = self.templates[template_id]
-        template['usage_count'] += 1
-        template['last_used'] = datetime.now().isoformat()
+        timestamp = datetime.now().isoformat()
+        self._apply_usage(template_id, timestamp)
+        self.usage_log.record(template_id, "use", timestamp)
 
-        self._save_templates()
+        return self.templates[template_id]
 
-        return template
+    def _apply_usage(self, template_id: str, timestamp: str) -> bool:
+        """Fold one usage event into the in-memory counters"""
+        template = self.templates.get(template_id)
+        if template is None:
+            return False
+        template['usage_count'] = template.get('usage_count', 0) + 1
+        template['last_used'] = timestamp or datetime.now().isoformat()
+        return True
 
     def duplicate_template(self, template_id: str, new_name: str = None) -> Optional[Dict]:
         """
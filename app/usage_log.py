@@ -0,0 +1,91 @@
+"""
+Usage Event Log
+Append-only usage events so counter bumps don't rewrite whole data files
+"""
+
+import atexit
+import json
+import os
+import time
+from datetime import datetime
+from pathlib import Path
+from typing import Callable, Dict, Iterator, Optional
+
+# Compaction thresholds (whichever comes first)
+USAGE_COMPACT_EVENTS = 500     # Events appended since the last compaction
+USAGE_COMPACT_INTERVAL = 300   # Seconds since the last compaction
+
+
+def write_json_atomic(path: Path, data, **dump_kwargs):
+    """Write JSON to a temp file and rename it over path."""
+    tmp_path = path.with_name(path.name + ".tmp")
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(data, f, **dump_kwargs)
+    os.replace(tmp_path, path)
+
+
+class UsageEventLog:
+    """
+    JSON-lines log of usage events ({"id", "kind", "ts"}) beside a data file.
+
+    The owning manager applies each event to its in-memory counters and
+    appends it here. Compaction is the owner's normal full save: once the
+    data file holds the folded counters the log is truncated. Events left
+    over from a crash are replayed on the next load.
+    """
+
+    def __init__(self, path: Path, compact: Callable[[], None]):
+        self.path = Path(path)
+        self.compact = compact
+        self.handle = None
+        self.pending = 0
+        self.last_compaction = time.monotonic()
+        atexit.register(self.close)
+
+    def replay(self) -> Iterator[Dict]:
+        """Yield events left in the log, skipping damaged lines."""
+        if not self.path.exists():
+            return
+        with open(self.path, 'r', encoding='utf-8') as f:
+            for line in f:
+                try:
+                    event = json.loads(line)
+                except ValueError:
+                    continue
+                if isinstance(event, dict) and event.get("id"):
+                    self.pending += 1
+                    yield event
+
+    def record(self, item_id: str, kind: str = "use", timestamp: Optional[str] = None) -> str:
+        """Append one event, compacting if the log has grown enough."""
+        timestamp = timestamp or datetime.now().isoformat()
+        if self.handle is None:
+            self.handle = open(self.path, 'a', encoding='utf-8')
+        self.handle.write(json.dumps({"id": item_id, "kind": kind, "ts": timestamp}) + "\n")
+        self.handle.flush()
+        self.pending += 1
+
+        if (self.pending >= USAGE_COMPACT_EVENTS or
+                time.monotonic() - self.last_compaction >= USAGE_COMPACT_INTERVAL):
+            self.compact()
+        return timestamp
+
+    def reset(self):
+        """Truncate the log; call after the data file has been saved."""
+        if self.handle is not None:
+            self.handle.close()
+            self.handle = None
+        self.path.unlink(missing_ok=True)
+        self.pending = 0
+        self.last_compaction = time.monotonic()
+
+    def close(self):
+        """Compact outstanding events (used on shutdown)."""
+        if self.pending:
+            try:
+                self.compact()
+            except Exception as e:
+                print(f"Usage log compaction failed for {self.path}: {e}")
+        if self.handle is not None:
+            self.handle.close()
+            self.handle = None